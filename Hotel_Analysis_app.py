@@ -1,16 +1,150 @@
+import time
+# Stamped before the other imports so the cold-start measurement includes them
+SCRIPT_STARTED = time.perf_counter()
+
+import os
+import glob
+import hashlib
+import logging
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy.stats import chi2_contingency
-import plotly.express as px
-import plotly.graph_objects as go
-
-def load_data():
-    df = pd.read_csv('final_hotel_bookings.csv')
+from bookings import (MONTHS_ORDER, HISTOGRAM_SPEC, optimize_dtypes, rollup, counts_by_cancellation, cancelled_strata,
+                      lead_time_category, test_column_names)
+from revenue_simulation import run_scenarios
+from control_charts import control_chart, downsample, POINT_BUDGET
+from histograms import plot_histogram
+from hypothesis_tests import chi_square_from_tables, resampling_tests, adjust_pvalues
+from streaming import summarize_frame, summarize_source
+from subsets import SubsetSummary, build_subset_index
+from stays import stay_rollup
+from timings import Timings, json_lines_logger
+from chart_cache import ChartCache, subplots
+from filters import FILTER_COLUMNS, PERIOD_COLUMN, build_filter_index, filter_values, filter_mask, period_label, period_range
+
+DATA_PATH = 'final_hotel_bookings.csv'
+CACHE_DIR = '.cache'
+
+# Sources larger than this are summarised chunk by chunk instead of being loaded whole
+MAX_IN_MEMORY_BYTES = int(os.environ.get('HOTEL_MAX_IN_MEMORY_MB', 1024)) * 2 ** 20
+
+def source_version(path):
+    # mtime + size is enough to notice a re-exported file without hashing it
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+def streaming_mode(path):
+    return os.path.getsize(path) > MAX_IN_MEMORY_BYTES
+
+def source_key(path):
+    # Sources with the same file name in different directories get separate cache files
+    return hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16]
+
+def columnar_cache_path(path, version):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIR, f"{name}-{source_key(path)}-{version}.parquet")
+
+def build_columnar_cache(path, version):
+    cache_path = columnar_cache_path(path, version)
+    if os.path.exists(cache_path):
+        return pd.read_parquet(cache_path)
+
+    df = optimize_dtypes(pd.read_csv(path))
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = cache_path + '.tmp'
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, cache_path)
+
+    # Drop caches built from older versions of this exact source file
+    name = os.path.splitext(os.path.basename(path))[0]
+    for old in glob.glob(os.path.join(CACHE_DIR, glob.escape(f"{name}-{source_key(path)}-") + '*.parquet')):
+        if old != cache_path:
+            os.remove(old)
     return df
 
+@st.cache_resource(max_entries=2)
+def _load_columnar(path, version):
+    return build_columnar_cache(path, version)
+
+@st.cache_resource(max_entries=2)
+def _load_summary(path, version, streaming):
+    summary = summarize_source(path) if streaming else summarize_frame(_load_columnar(path, version))
+    # Identifies the data behind every chart rendered from this summary
+    summary['key'] = (path, version, ())
+    return summary
+
+@st.cache_resource(max_entries=2)
+def _load_filter_index(path, version):
+    return build_filter_index(_load_columnar(path, version))
+
+@st.cache_resource(max_entries=2)
+def _load_subset_index(path, version):
+    return build_subset_index(_load_columnar(path, version))
+
+@st.cache_resource(max_entries=32)
+def _load_filtered(path, version, filter_key):
+    # One summary per distinct filter combination, shared by every session. It keeps the row
+    # mask, not a copy of the rows, and bincounts each piece the first time a page reads it.
+    mask = filter_mask(_load_filter_index(path, version), dict(filter_key))
+    if mask is None:
+        return _load_summary(path, version, False)
+    summary = SubsetSummary(_load_subset_index(path, version), mask)
+    summary['key'] = (path, version, filter_key)
+    return summary
+
+def sidebar_filters(index):
+    st.sidebar.header('Filters')
+    selections = {}
+    for column in FILTER_COLUMNS:
+        options = filter_values(index, column)
+        if options:
+            selections[column] = st.sidebar.multiselect(column.replace('_', ' ').capitalize(), options)
+    periods = [p for p in filter_values(index, PERIOD_COLUMN) if p > 0]
+    if periods:
+        start, end = st.sidebar.select_slider('Arrival month', options=periods, value=(periods[0], periods[-1]), format_func=period_label)
+        if (start, end) != (periods[0], periods[-1]):
+            selections[PERIOD_COLUMN] = period_range(index, start, end)
+    # Hashable and order-independent so identical selections share one cache entry
+    return tuple((column, tuple(sorted(values))) for column, values in selections.items() if values)
+
+def load_filtered(path=DATA_PATH):
+    # Returns (df, summary): the whole frame and the summary of the rows matching the sidebar
+    # filters; summary.get('mask') selects those rows from df (None when nothing is filtered).
+    # The frame is shared by every session, so pages must not modify it in place.
+    version = source_version(path)
+    if streaming_mode(path):
+        st.sidebar.caption('Filters are not available for sources processed in streaming mode.')
+        return None, _load_summary(path, version, True)
+    filter_key = sidebar_filters(_load_filter_index(path, version))
+    return _load_columnar(path, version), _load_filtered(path, version, filter_key)
+
+# Rendered PNGs shared by all sessions; matplotlib figures never outlive a render
+CHART_CACHE_BYTES = int(os.environ.get('HOTEL_CHART_CACHE_MB', 128)) * 2 ** 20
+
+@st.cache_resource
+def chart_cache():
+    return ChartCache(CHART_CACHE_BYTES)
+
+def show_chart(summary, chart_id, draw, *params):
+    # chart_id is 'page/chart'; params are the widget values the chart depends on
+    with timings.section(chart_id):
+        st.image(chart_cache().render((chart_id, summary['key'], params), draw))
+
+def hypothesis_test_columns(df):
+    return [df[c] for c in test_column_names(df)] + [lead_time_category(df['lead_time']).rename('lead_time_category')]
+
+# Worker processes per permutation/bootstrap run; several sessions can run them at once
+RESAMPLING_JOBS = int(os.environ.get('HOTEL_RESAMPLING_JOBS', 2))
+
+@st.cache_data(max_entries=8)
+def run_resampling_tests(_df, _mask, data_key, n_permutations, n_resamples, seed=0):
+    # data_key is the summary's key, which identifies the source version and the filter behind _mask
+    df = _df if _mask is None else _df.loc[_mask, test_column_names(_df) + ['lead_time', 'adr', 'is_canceled']]
+    permutation, bootstrap = resampling_tests(hypothesis_test_columns(df), [df['lead_time'], df['adr']], df['is_canceled'],
+                                              n_permutations, n_resamples, seed, n_jobs=RESAMPLING_JOBS)
+    permutation['p_adjusted'] = adjust_pvalues(permutation['p_value'])
+    return permutation, bootstrap
+
 def introduction():
     st.title('Introduction')
     st.image('Hotel_Image.jpg', caption='Hotel Booking Analysis', use_column_width=True)
@@ -58,7 +192,8 @@ def introduction():
                 
     ''')
 
-def overview(df):
+def overview(summary):
+    import seaborn as sns
     st.title("Numerical Variables Overview")
 
     st.subheader("Distribution of Key Numerical Variables")
@@ -70,264 +205,354 @@ def overview(df):
     - **Arrival Date (Day of Month) Distribution**: The arrival day of the month is fairly distributed, with slight dips at the end of the month. except for the end of the month, which shows that we recieve a higher number of guests by the end of each month.
     - **Arrival Date (Week Number) Distribution**: The arrival week number shows a bimodal distribution, with peaks around week 30 (mid-July) and week 40 (early October). This suggests that there are more bookings during the summer.
     """)
-    fig, axes = plt.subplots(2, 2, figsize=(15, 10))
-    sns.histplot(df['lead_time'], kde=True, ax=axes[0, 0])
-    sns.histplot(df['adr'], kde=False, bins=30, ax=axes[0, 1])
-    sns.histplot(df['arrival_date_day_of_month'], kde=False, bins=30, ax=axes[1, 0])
-    sns.histplot(df['arrival_date_week_number'], kde=False, bins=30, ax=axes[1, 1])
-    st.pyplot(fig)
+    def draw():
+        fig, axes = subplots(2, 2, figsize=(15, 10))
+        for column, ax in zip(HISTOGRAM_SPEC, axes.flat):
+            plot_histogram(summary['histograms'][column], ax, color=sns.color_palette()[0])
+            ax.set_xlabel(column)
+        return fig
+    show_chart(summary, 'overview/histograms', draw)
 
     st.subheader("Correlation Heatmap")
-    corr_matrix = df.corr()
-    fig, ax = plt.subplots(figsize=(12,8))
-    sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', fmt=".2f", ax=ax)
-    st.pyplot(fig)
-
-def booking_analysis(df):
+    def draw():
+        corr_matrix = summary['correlation'].matrix()
+        fig, ax = subplots(figsize=(12,8))
+        sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', fmt=".2f", ax=ax)
+        return fig
+    show_chart(summary, 'overview/correlation', draw)
+
+def booking_analysis(summary):
+    import seaborn as sns
+    cube = summary['cube']
     st.title("Booking Analysis")
 
     st.subheader("Distribution of Total Bookings per Hotel Types")
     st.markdown("""
     - The distribution of bookings between the two types of hotels in the dataset shows that City Hotel has significantly more bookings than Resort Hotel.
     """)
-    fig, ax = plt.subplots(figsize=(8,6))
-    sns.countplot(x='hotel', data=df, ax=ax)
-    st.pyplot(fig)
+    def draw():
+        hotel_bookings = rollup(cube, 'hotel')['bookings']
+        fig, ax = subplots(figsize=(8,6))
+        sns.barplot(x=hotel_bookings.index, y=hotel_bookings.values, ax=ax)
+        return fig
+    show_chart(summary, 'booking/hotel', draw)
 
     st.subheader("Number of Bookings for Each Month")
     st.markdown("""- The number of bookings varies across the months, with August being the month with the most bookings and January being the month with the least bookings.""")
-    months_order = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
-    fig, ax = plt.subplots(figsize=(12,6))
-    sns.countplot(x='arrival_date_month', data=df, order=months_order, ax=ax)
-    st.pyplot(fig)
+    def draw():
+        month_bookings = rollup(cube, 'arrival_date_month')['bookings'].reindex(MONTHS_ORDER, fill_value=0)
+        fig, ax = subplots(figsize=(12,6))
+        sns.barplot(x=month_bookings.index, y=month_bookings.values, ax=ax)
+        return fig
+    show_chart(summary, 'booking/month', draw)
 
     st.subheader("Distribution of Number of Bookings in Seasons")
     st.markdown("""- Most bookings are made in Summer, followed by Spring, Fall, and Winter.""")
 
-    fig, ax = plt.subplots(figsize=(8,6))
-    sns.countplot(x='season', data=df, ax=ax)
-    st.pyplot(fig)
+    def draw():
+        season_bookings = rollup(cube, 'season')['bookings']
+        fig, ax = subplots(figsize=(8,6))
+        sns.barplot(x=season_bookings.index, y=season_bookings.values, ax=ax)
+        return fig
+    show_chart(summary, 'booking/season', draw)
 
     st.subheader("Top 10 Countries with the Most Bookings")
     st.markdown("""- the majority of bookings are from guests in Portugal (PRT), followed by Great Britain (GBR), France (FRA), Spain (ESP), and Germany (DEU). The other countries in the top 10 are Ireland (IRL), Italy (ITA), Belgium (BEL), Brazil (BRA), and the Netherlands (NLD).""")
 
-    top_countries = df['country'].value_counts().head(10)
-    fig, ax = plt.subplots(figsize=(10,6))
-    sns.barplot(x=top_countries.index, y=top_countries.values, ax=ax)
-    st.pyplot(fig)
+    def draw():
+        top_countries = rollup(cube, 'country')['bookings'].nlargest(10)
+        fig, ax = subplots(figsize=(10,6))
+        sns.barplot(x=top_countries.index, y=top_countries.values, ax=ax)
+        return fig
+    show_chart(summary, 'booking/top_countries', draw)
 
-def adr_analysis(df):
+def adr_analysis(summary):
+    import seaborn as sns
+    cube = summary['cube']
     st.title("ADR (Average Daily Rate) Analysis")
 
     st.subheader("Average Daily Rate (ADR) by Hotel Type")
     st.markdown("""- The average daily rate (ADR) is higher for City Hotel compared to Resort Hotel.""")
 
-    hotel_adr_mean = df.groupby('hotel')['adr'].mean().reset_index()
-    fig, ax = plt.subplots(figsize=(8, 6))
-    sns.barplot(x='hotel', y='adr', data=hotel_adr_mean, ax=ax)
-    st.pyplot(fig)
+    def draw():
+        hotel_adr_mean = rollup(cube, 'hotel')['adr_mean'].rename('adr').rename_axis('hotel').reset_index()
+        fig, ax = subplots(figsize=(8, 6))
+        sns.barplot(x='hotel', y='adr', data=hotel_adr_mean, ax=ax)
+        return fig
+    show_chart(summary, 'adr/hotel', draw)
 
     st.subheader("Total ADR for Each Month")
-    st.markdown("""- The average daily rate (ADR) is higher for City Hotel compared to Resort Hotel.""")
-    months_order = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
-    total_adr_month = df.groupby('arrival_date_month')['adr'].sum().reindex(months_order)
-    fig, ax = plt.subplots(figsize=(12,6))
-    sns.barplot(x=total_adr_month.index, y=total_adr_month.values, ax=ax)
-    st.pyplot(fig)
+    st.markdown("""- Revenue earned in each calendar month: the ADR of every night guests actually stayed (cancelled bookings excluded). A stay that runs into the next month counts towards both months.""")
+    def draw():
+        total_adr_month = stay_rollup(summary['stays'], 'stay_month', is_canceled=0)['revenue'].reindex(MONTHS_ORDER, fill_value=0)
+        fig, ax = subplots(figsize=(12,6))
+        sns.barplot(x=total_adr_month.index, y=total_adr_month.values, ax=ax)
+        ax.set_ylabel('Revenue (ADR x nights)')
+        return fig
+    show_chart(summary, 'adr/month', draw)
+
+    st.subheader("Occupied Room-Nights and Revenue per Night")
+    st.markdown("""- Rooms occupied and revenue earned on each night, per hotel, from the nights of non-cancelled stays.""")
+    def draw():
+        nightly = stay_rollup(summary['stays'], ['stay_date', 'hotel'], is_canceled=0).unstack('hotel', fill_value=0)
+        fig, axes = subplots(2, 1, figsize=(12, 8), sharex=True)
+        nightly['room_nights'].plot(ax=axes[0], linewidth=0.8)
+        axes[0].set_ylabel('Room-nights')
+        nightly['revenue'].plot(ax=axes[1], linewidth=0.8, legend=False)
+        axes[1].set_ylabel('Revenue')
+        axes[1].set_xlabel('Night of stay')
+        return fig
+    if (summary['stays'].index.get_level_values('is_canceled') == 0).any():
+        show_chart(summary, 'adr/nightly', draw)
+    else:
+        st.info('No non-cancelled stays match the filters.')
 
     st.subheader("Average ADR for Top 10 Countries with the Most Bookings")
     st.markdown("""- Guests from Portugal (PRT), which has the highest number of bookings, have a lower average ADR compared to some other countries.""")
-    top_countries_adr = df['country'].value_counts().index[:10]
-    df_top_countries_adr = df[df['country'].isin(top_countries_adr)]
-    avg_adr_countries = df_top_countries_adr.groupby('country')['adr'].mean()
-    colors = ['b', 'g', 'grey', 'c', 'm', 'y', 'orange', 'purple', 'brown', 'pink']
-    fig, ax = plt.subplots(figsize=(10, 6))
-    avg_adr_countries.sort_values(ascending=False).plot(kind='bar', color=colors, ax=ax)
-    st.pyplot(fig)
-
-def cancellation_analysis(df):
+    def draw():
+        country_adr = rollup(cube, 'country')
+        avg_adr_countries = country_adr.loc[country_adr['bookings'].nlargest(10).index, 'adr_mean']
+        colors = ['b', 'g', 'grey', 'c', 'm', 'y', 'orange', 'purple', 'brown', 'pink']
+        fig, ax = subplots(figsize=(10, 6))
+        avg_adr_countries.sort_values(ascending=False).plot(kind='bar', color=colors, ax=ax)
+        return fig
+    show_chart(summary, 'adr/top_countries', draw)
+
+def cancellation_analysis(summary):
+    cube = summary['cube']
     st.subheader('Total Bookings vs Total Cancellations (Top 10 Countries)')
     st.markdown("""- The top 10 countries with the highest number of bookings also have a significant number of cancellations. Portugal (PRT) has the highest number of bookings and cancellations, indicating a high demand from this country but also a high likelihood of cancellation.""")
-    # Calculate the number and proportion of cancellations for each country
-    country_cancellations = df[df['is_canceled'] == 1]['country'].value_counts()
-    country_cancellations_proportion = df[df['is_canceled'] == 1]['country'].value_counts(normalize=True)
+    def draw():
+        # Calculate the total number of bookings and cancellations for each country
+        country_df = counts_by_cancellation(cube, 'country')
 
-    # Calculate the total number of bookings for each country
-    country_bookings = df['country'].value_counts()
+        # Select the top 10 countries in terms of total bookings
+        top_countries_df = country_df.nlargest(10, 'Total_Bookings')
 
-    # Select the top 10 countries in terms of total bookings
-    top_countries_bookings = country_bookings[:10]
-    top_countries_cancellations = country_cancellations[top_countries_bookings.index]
-
-    # Create a new DataFrame for plotting
-    top_countries_df = pd.DataFrame({
-        'Total_Bookings': top_countries_bookings,
-        'Total_Cancellations': top_countries_cancellations
-    })
-
-    # Plot the total number of bookings vs total cancellations
-    top_countries_df.plot(kind='bar', figsize=(10, 6))
-    st.pyplot(plt.gcf())
-    plt.clf()
+        # Plot the total number of bookings vs total cancellations
+        fig, ax = subplots(figsize=(10, 6))
+        top_countries_df.plot(kind='bar', ax=ax)
+        return fig
+    show_chart(summary, 'cancellation/top_countries', draw)
 
     st.subheader('Proportion of Cancellations by Guest Type')
     st.markdown("""- Couples have the highest cancellation rate, followed by families, groups, and single guests.""")
-    # Calculate the proportion of bookings that were cancelled for each guest type
-    guest_cancellations = df.groupby('guest_type')['is_canceled'].mean()
+    def draw():
+        # Calculate the proportion of bookings that were cancelled for each guest type
+        guest_df = counts_by_cancellation(cube, 'guest_type')
+        guest_cancellations = guest_df['Total_Cancellations'] / guest_df['Total_Bookings']
 
-    # Plot the results
-    guest_cancellations.plot(kind='bar', figsize=(10, 6))
-    st.pyplot(plt.gcf())
-    plt.clf()
+        # Plot the results
+        fig, ax = subplots(figsize=(10, 6))
+        guest_cancellations.plot(kind='bar', ax=ax)
+        return fig
+    show_chart(summary, 'cancellation/guest_type', draw)
 
     st.subheader('Total Bookings vs Total Cancellations (Market Segment)')
     st.markdown("""- The 'Online TA' market segment has the highest number of bookings and cancellations, followed by 'Offline TA/TO' and 'Groups'. The 'Complementary', 'Aviation', and 'Undefined' segments have the least number of bookings and cancellations.""")
 
-    # Calculate the total number of bookings and cancellations for each market segment
-    market_segment_bookings = df['market_segment'].value_counts()
-    market_segment_cancellations = df[df['is_canceled'] == 1]['market_segment'].value_counts()
-
-    # Create a new DataFrame for plotting
-    market_segment_df = pd.DataFrame({
-        'Total_Bookings': market_segment_bookings,
-        'Total_Cancellations': market_segment_cancellations
-    }).sort_values(by='Total_Bookings', ascending=False)
+    def draw():
+        # Calculate the total number of bookings and cancellations for each market segment
+        market_segment_df = counts_by_cancellation(cube, 'market_segment').sort_values(by='Total_Bookings', ascending=False)
 
-    # Plot the total number of bookings vs total cancellations
-    market_segment_df.plot(kind='bar', figsize=(10, 6))
-    st.pyplot(plt.gcf())
-    plt.clf()
+        # Plot the total number of bookings vs total cancellations
+        fig, ax = subplots(figsize=(10, 6))
+        market_segment_df.plot(kind='bar', ax=ax)
+        return fig
+    show_chart(summary, 'cancellation/market_segment', draw)
 
     st.subheader('Total Bookings vs Total Cancellations by Deposit Type')
     st.markdown("""- The 'No Deposit' type has the highest number of bookings and cancellations, but the cancellation percentage is lower compared to the 'Non Refund' type, which has a cancellation rate of almost 100%. 'Refundable' deposits have the lowest number of bookings and cancellations, but their cancellation rate is similar to 'No Deposit'.""")
-    # Calculate total bookings for each deposit type
-    deposit_total_bookings = df['deposit_type'].value_counts()
+    def draw():
+        # Calculate total bookings and total cancellations for each deposit type
+        deposit_data = counts_by_cancellation(cube, 'deposit_type').sort_values(by='Total_Bookings', ascending=False)
 
-    # Calculate total cancellations for each deposit type
-    deposit_total_cancellations = df[df['is_canceled'] == 1]['deposit_type'].value_counts()
+        # Calculate cancellation percent for each deposit type
+        deposit_data['Cancellation_Percent'] = (deposit_data['Total_Cancellations'] / deposit_data['Total_Bookings']) * 100
 
-    # Combine total bookings and total cancellations into one dataframe
-    deposit_data = pd.DataFrame({'Total_Bookings': deposit_total_bookings, 
-                                 'Total_Cancellations': deposit_total_cancellations})
+        # Plot total bookings and total cancellations for each deposit type in one chart
+        fig, ax = subplots(figsize=(10, 6))
+        deposit_data[['Total_Bookings', 'Total_Cancellations']].plot(kind='bar', ax=ax)
+        return fig
+    show_chart(summary, 'cancellation/deposit_type', draw)
 
-    # Calculate cancellation percent for each deposit type
-    deposit_data['Cancellation_Percent'] = (deposit_data['Total_Cancellations'] / deposit_data['Total_Bookings']) * 100
 
-    # Plot total bookings and total cancellations for each deposit type in one chart
-    deposit_data[['Total_Bookings', 'Total_Cancellations']].plot(kind='bar', figsize=(10, 6))
-    st.pyplot(plt.gcf())
-    plt.clf()
-
-
-def guest_analysis(df):
+def guest_analysis(summary):
+    import seaborn as sns
+    cube = summary['cube']
     st.title("Guest Analysis")
 
     st.subheader("Guest Type Distribution")
     st.markdown("""- Most of the guests are Couple, followed by Single, Family, and Group.""")
-    guest_type_counts = df['guest_type'].value_counts()
-    fig, ax = plt.subplots(figsize=(6, 6))
-    ax.pie(guest_type_counts, labels=guest_type_counts.index, autopct='%1.1f%%', startangle=140)
-    ax.axis('equal')
-    st.pyplot(fig)
+    def draw():
+        guest_type_counts = rollup(cube, 'guest_type')['bookings'].sort_values(ascending=False)
+        fig, ax = subplots(figsize=(6, 6))
+        ax.pie(guest_type_counts, labels=guest_type_counts.index, autopct='%1.1f%%', startangle=140)
+        ax.axis('equal')
+        return fig
+    show_chart(summary, 'guest/guest_type', draw)
 
     st.subheader("ADR Share per Guest Type")
     st.markdown("""- Couple guests contribute the most to the total ADR, followed by Single, Family, and Group.""")
-    total_adr_per_category = df.groupby('guest_type')['adr'].sum()
-    fig, ax = plt.subplots(figsize=(6, 6))
-    ax.pie(total_adr_per_category, labels=total_adr_per_category.index, autopct='%1.1f%%', startangle=140)
-    ax.axis('equal')
-    st.pyplot(fig)
+    def draw():
+        total_adr_per_category = rollup(cube, 'guest_type')['adr_sum']
+        fig, ax = subplots(figsize=(6, 6))
+        ax.pie(total_adr_per_category, labels=total_adr_per_category.index, autopct='%1.1f%%', startangle=140)
+        ax.axis('equal')
+        return fig
+    show_chart(summary, 'guest/adr_share', draw)
 
     st.subheader('Repeated Guests by Deposit Type')
     st.markdown("""- The 'No Deposit' type also has the highest number of repeated guests, followed by 'Non Refund' and 'Refundable'. The percentage of repeated guests is highest for 'No Deposit', followed by 'Refundable' and 'Non Refund'.""")
-    # Filter data for repeated guests
-    repeated_guests_data = df[df['is_repeated_guest'] == 1]
-
-    # Count the number of repeated guests for each deposit type
-    repeated_guests_by_deposit = repeated_guests_data['deposit_type'].value_counts()
-
-    # Plot the number of repeated guests for each deposit type
-    plt.figure(figsize=(8, 6))
-    sns.barplot(x=repeated_guests_by_deposit.index, y=np.log1p(repeated_guests_by_deposit.values))
-    plt.title('Repeated Guests by Deposit Type')
-    plt.xlabel('Deposit Type')
-    plt.ylabel('Number of Guests (Log Scale)')
-    st.pyplot(plt.gcf())
-    plt.clf()
-
-def advanced_analysis(df):
+    def draw():
+        # Count the number of repeated guests for each deposit type
+        # Over every deposit type in view, so a selection without repeated guests still plots
+        deposit_types = rollup(cube, 'deposit_type').index
+        repeated_guests_by_deposit = rollup(cube, 'deposit_type', is_repeated_guest=1)['bookings'].reindex(deposit_types, fill_value=0).sort_values(ascending=False)
+
+        # Plot the number of repeated guests for each deposit type
+        fig, ax = subplots(figsize=(8, 6))
+        sns.barplot(x=repeated_guests_by_deposit.index, y=np.log1p(repeated_guests_by_deposit.values), ax=ax)
+        ax.set_title('Repeated Guests by Deposit Type')
+        ax.set_xlabel('Deposit Type')
+        ax.set_ylabel('Number of Guests (Log Scale)')
+        return fig
+    show_chart(summary, 'guest/repeated_by_deposit', draw)
+
+def revenue_simulation_section(summary):
+    cube = summary['cube']
+    # Revenue (ADR x nights) of the not canceled bookings
+    adr_sum_not_canceled = rollup(cube, 'is_canceled')['revenue_sum'].get(0, 0.0)
+
+    rates = st.multiselect('Conversion rates (%)', list(range(5, 100, 5)), default=[25, 50, 75])
+    segment_by = st.selectbox('Per-segment conversion rates', ['None', 'market_segment', 'deposit_type', 'lead_time_category'])
+    n_scenarios = st.select_slider('Simulated scenarios', options=[1000, 10000, 50000, 100000], value=10000)
+
+    # Simulate conversion of canceled bookings
+    strata = cancelled_strata(cube, summary['lead_time'], None if segment_by == 'None' else segment_by)
+    scenarios = {f'Convert {rate}%': rate / 100 for rate in sorted(rates)}
+    if segment_by != 'None':
+        with st.expander(f'Conversion rate (%) per {segment_by}'):
+            segment_rates = [st.number_input(str(segment), 0, 100, 50, 5, key=f'rate_{segment_by}_{segment}') for segment in strata.index]
+        scenarios['Per segment'] = np.array(segment_rates) / 100
+    if not scenarios:
+        st.info('Select at least one conversion rate to run the simulation.')
+        return
+    simulation_df = run_scenarios(strata, scenarios, n_scenarios=n_scenarios, seed=0)
+    simulation_df = simulation_df + adr_sum_not_canceled
+
+    def draw():
+        fig, ax = subplots(figsize=(10, 6))
+        labels = ['Actual Not Canceled'] + [f'{label}(+{(row["p50"] - adr_sum_not_canceled) / 1e6:.2f}m)' for label, row in simulation_df.iterrows()]
+        medians = np.r_[adr_sum_not_canceled, simulation_df['p50']] / 1e6
+        errors = np.vstack([np.r_[0, simulation_df['p50'] - simulation_df['p5']], np.r_[0, simulation_df['p95'] - simulation_df['p50']]]) / 1e6
+        bars = ax.bar(labels, medians, yerr=errors, capsize=6)
+        ax.set_title('Revenue for Different Scenarios (median, 5th-95th percentile)')
+        ax.set_xlabel('Scenario')
+        ax.set_ylabel('Revenue (in million)')
+        ax.set_xticklabels(labels, rotation=45, ha='right')
+        # Offset in points: an offset in data units lands far off the axes when revenue is small
+        ax.bar_label(bars, fmt='%.2f', padding=3)
+        return fig
+    scenario_key = tuple((label, tuple(np.atleast_1d(rates))) for label, rates in scenarios.items())
+    show_chart(summary, 'advanced/revenue_scenarios', draw, segment_by, n_scenarios, scenario_key)
+    st.dataframe((simulation_df / 1e6).round(3).rename(columns=lambda c: f'{c} (million)'))
+
+CONTROL_CHART_METRICS = {'Lead Time': 'lead_time', 'ADR': 'adr', 'Cancellation Rate': 'is_canceled'}
+
+def daily_control_chart(daily, column):
+    # One point per arrival date in both loading modes: the mean of that day's bookings, or
+    # for cancellation the share of them cancelled
+    bookings = daily['bookings'].to_numpy(dtype='float64')
+    values = daily[column].to_numpy(dtype='float64') / bookings
+    if column == 'is_canceled':
+        # p-chart: a day's rate over n bookings varies by sqrt(p(1-p)/n) around the overall rate
+        p = daily[column].sum() / bookings.sum()
+        chart, limits = control_chart(values, center=p, std=np.sqrt(p * (1 - p) / bookings.mean()))
+    else:
+        chart, limits = control_chart(values)
+    chart.index = daily.index
+    return chart, limits
+
+def control_chart_section(summary):
+    metric = st.selectbox('Control chart metric', list(CONTROL_CHART_METRICS))
+    st.subheader(f'Control Chart for {metric}')
+    chart, limits = daily_control_chart(summary['daily'], CONTROL_CHART_METRICS[metric])
+    st.markdown(f"""- Each point is one arrival date: the mean {metric.lower()} of the bookings arriving that day (for the cancellation rate, the share of them cancelled). The mean is {limits['mean']:.2f} with a standard deviation of {limits['std']:.2f}, so the upper control limit (USL) is {limits['ucl']:.2f} and the lower control limit (LSL) is {max(0, limits['lcl']):.2f}.
+    - The black line is an exponentially weighted moving average (dotted lines are its control limits), and the lower panel shows CUSUM statistics, which drift past the red limits when the level shifts.""")
+    show_chart(summary, 'advanced/control_chart', lambda: draw_control_chart(chart, limits, metric), metric)
+
+def draw_control_chart(chart, limits, metric):
+    points = downsample(chart, 'value', POINT_BUDGET)
+    lcl = max(0, limits['lcl'])
+
+    fig, (ax, ax_cusum) = subplots(2, 1, figsize=(12, 9), sharex=True, gridspec_kw={'height_ratios': [3, 1]})
+    ax.plot(points.index, points['value'], linewidth=0.5, alpha=0.6, label=f'{metric} (daily)')
+    ax.plot(points.index, points['ewma'], color='k', linewidth=1, label='EWMA')
+    ax.axhline(limits['mean'], color='r', linestyle='dashed', linewidth=2, label=f"Mean: {limits['mean']:.2f} (Std. Dev.: {limits['std']:.2f})")
+    ax.axhline(limits['ucl'], color='g', linestyle='dashed', linewidth=2, label=f"USL: {limits['ucl']:.2f}")
+    ax.axhline(lcl, color='g', linestyle='dashed', linewidth=2, label=f"LSL: {lcl:.2f}")
+    ax.axhline(limits['ewma_ucl'], color='k', linestyle='dotted', linewidth=1)
+    ax.axhline(limits['ewma_lcl'], color='k', linestyle='dotted', linewidth=1)
+    ax.legend(loc='upper right')
+    ax_cusum.plot(points.index, points['cusum_upper'], label='CUSUM +')
+    ax_cusum.plot(points.index, -points['cusum_lower'], label='CUSUM -')
+    ax_cusum.axhline(limits['cusum_h'], color='r', linestyle='dashed', linewidth=1)
+    ax_cusum.axhline(-limits['cusum_h'], color='r', linestyle='dashed', linewidth=1)
+    ax_cusum.legend(loc='upper right')
+    ax_cusum.set_xlabel('Arrival Date')
+    return fig
+
+def advanced_analysis(df, summary):
+    import seaborn as sns
+    cube = summary['cube']
     st.title("Advanced Analysis")
 
-    st.subheader("Control Chart for Lead Time")
-    st.markdown("""- The mean lead time is around 104 days, with a standard deviation of 107 days. The upper control limit (USL) is around 425 days, and the lower control limit (LSL) is 0 days. That means that the majority of bookings are made within a year before the stay.""")
-    mean_lead_time = df['lead_time'].mean()
-    std_dev_lead_time = df['lead_time'].std()
-    USL_lead_time = mean_lead_time + 3 * std_dev_lead_time
-    LSL_lead_time = max(0, mean_lead_time - 3 * std_dev_lead_time)
-    fig, ax = plt.subplots(figsize=(12, 9))
-    df['lead_time'].plot(kind='line', ax=ax)
-    ax.axhline(mean_lead_time, color='r', linestyle='dashed', linewidth=2)
-    ax.axhline(USL_lead_time, color='g', linestyle='dashed', linewidth=2)
-    ax.axhline(LSL_lead_time, color='g', linestyle='dashed', linewidth=2)
-    ax.legend([f'Mean: {mean_lead_time:.2f}', f'Std. Dev.: {std_dev_lead_time:.2f}', f'USL: {USL_lead_time:.2f}'], loc='upper right')
-    st.pyplot(fig)
+    control_chart_section(summary)
 
     st.subheader("Cancellation Rate by Lead Time")
     st.markdown("""- Previous graph suggests that there is a positive relationship between lead time and cancellation. the longer the time between booking and actual stay, the more likely the booking is to be cancelled.""")
-    bins = [0, 60, 120, 180, 240, 300, 360, 420, 480, 540, 600, 660]
-    df['lead_time_category'] = pd.cut(df['lead_time'], bins)
-    cancellation_rates = df.groupby('lead_time_category')['is_canceled'].mean() * 100
-    fig, ax = plt.subplots(figsize=(12, 6))
-    sns.barplot(x=cancellation_rates.index, y=cancellation_rates.values, ax=ax)
-    st.pyplot(fig)
-
-    st.subheader("Sum of ADR for Each Category")
-    st.markdown("""- The total ADR for 'Not Canceled' bookings is higher than for 'Canceled' bookings. This might indicate that more revenue is lost due to cancellations.""")
-    adr_sum_grouped = df.groupby('is_canceled')['adr'].sum().reset_index()
-    adr_sum_grouped['is_canceled'] = adr_sum_grouped['is_canceled'].map({0: 'Not Canceled', 1: 'Canceled'})
-    fig, ax = plt.subplots(figsize=(10, 5))
-    bars = ax.bar(adr_sum_grouped['is_canceled'], adr_sum_grouped['adr'] / 1000000, color='skyblue')
-    ax.set_title('Sum of ADR for Each Category')
-    ax.set_xlabel('Category')
-    ax.set_ylabel('Sum of ADR (Million)')
-    for bar in bars:
-        yval = round(bar.get_height(), 2)
-        ax.text(bar.get_x() + bar.get_width() / 2, yval, f'{yval:.2f}M', ha='center', va='bottom')
-    st.pyplot(fig)
-
-    st.subheader("Sum of ADR for Different Scenarios")
-    st.markdown("""- From the chart, you can clearly see the potential increase in the sum of ADR if a certain percentage of the canceled bookings were converted to not canceled. This can provide an estimate of the potential revenue increase if the hotel can reduce the cancellation rate.
-                - As we can see, there is significant potential to increase revenue by reducing the cancellation rate. Converting even a quarter of the cancelled bookings could result in an increase in total ADR by about 1.16 million. The potential increase grows with the conversion rate, reaching about 3.48 million when 75 percent of cancelled bookings are converted. 
+    def draw():
+        lead_time_bookings = summary['lead_time']['bookings'].unstack(fill_value=0)
+        cancellation_rates = lead_time_bookings.get(1, 0) / lead_time_bookings.sum(axis=1) * 100
+        fig, ax = subplots(figsize=(12, 6))
+        sns.barplot(x=cancellation_rates.index, y=cancellation_rates.values, ax=ax)
+        return fig
+    show_chart(summary, 'advanced/lead_time_cancellation', draw)
+
+    st.subheader("Chi-square Tests of Independence with Cancellation")
+    st.markdown("""- Each categorical variable (and the lead time category) is tested against cancellation. P-values are Holm-adjusted for the number of tests, and Cramér's V shows the strength of the association.""")
+    st.dataframe(chi_square_from_tables(summary['contingency']))
+    if df is not None and st.checkbox('Run permutation and bootstrap tests'):
+        n_permutations = st.select_slider('Permutations', options=[1000, 5000, 10000], value=1000)
+        n_resamples = st.select_slider('Bootstrap resamples', options=[1000, 2000, 5000], value=1000)
+        permutation, bootstrap = run_resampling_tests(df, summary.get('mask'), summary['key'], n_permutations, n_resamples)
+        st.markdown("""- Permutation p-values of the chi-square statistic, and bootstrap 95% intervals for the difference in mean (canceled minus not canceled).""")
+        st.dataframe(permutation)
+        st.dataframe(bootstrap)
+
+    st.subheader("Revenue (ADR x nights) for Each Category")
+    st.markdown("""- The total revenue (ADR x nights) of 'Not Canceled' bookings is higher than that of 'Canceled' bookings, which is the revenue lost to cancellations.""")
+    def draw():
+        adr_sum_grouped = rollup(cube, 'is_canceled')['revenue_sum'].rename('revenue').rename_axis('is_canceled').reset_index()
+        adr_sum_grouped['is_canceled'] = adr_sum_grouped['is_canceled'].map({0: 'Not Canceled', 1: 'Canceled'})
+        fig, ax = subplots(figsize=(10, 5))
+        bars = ax.bar(adr_sum_grouped['is_canceled'], adr_sum_grouped['revenue'] / 1000000, color='skyblue')
+        ax.set_title('Revenue (ADR x nights) for Each Category')
+        ax.set_xlabel('Category')
+        ax.set_ylabel('Revenue (Million)')
+        for bar in bars:
+            yval = round(bar.get_height(), 2)
+            ax.text(bar.get_x() + bar.get_width() / 2, yval, f'{yval:.2f}M', ha='center', va='bottom')
+        return fig
+    show_chart(summary, 'advanced/adr_by_status', draw)
+
+    st.subheader("Revenue for Different Scenarios")
+    st.markdown("""- From the chart, you can clearly see the potential increase in revenue (ADR x nights) if a certain percentage of the canceled bookings were converted to not canceled. This can provide an estimate of the potential revenue increase if the hotel can reduce the cancellation rate.
+                - As we can see, there is significant potential to increase revenue by reducing the cancellation rate, even when only a quarter of the cancelled bookings are converted, and the potential increase grows with the conversion rate.
+                - Each scenario randomly converts cancelled bookings many times over; bars show the median outcome and the whiskers the 5th to 95th percentile range.
                 """)
-    # Create a DataFrame to store these values
-    # Calculate the sum of ADR for not canceled and canceled bookings
-    adr_sum_not_canceled = df[df['is_canceled'] == 0]['adr'].sum()
-    adr_sum_canceled = df[df['is_canceled'] == 1]['adr'].sum()
-
-    # Simulate conversion of canceled bookings
-    adr_sum_canceled_converted_25 = adr_sum_not_canceled + adr_sum_canceled * 0.25
-    adr_sum_canceled_converted_50 = adr_sum_not_canceled + adr_sum_canceled * 0.5
-    adr_sum_canceled_converted_75 = adr_sum_not_canceled + adr_sum_canceled * 0.75
-
-    # Create a DataFrame to store these values
-    simulation_df = pd.DataFrame({
-        'Scenario': ['Actual Not Canceled', 'Convert 25%(+1.16m)', 'Convert 50%(+2.32m)', 'Convert 75%)'],
-        'Sum ADR (in million)': [adr_sum_not_canceled / 1e6, adr_sum_canceled_converted_25 / 1e6,
-                                adr_sum_canceled_converted_50 / 1e6, adr_sum_canceled_converted_75 / 1e6]
-    })
-
-    fig, ax = plt.subplots(figsize=(10, 6))
-    bars = ax.bar(simulation_df['Scenario'], simulation_df['Sum ADR (in million)'])
-    ax.set_title('Sum of ADR for Different Scenarios')
-    ax.set_xlabel('Scenario')
-    ax.set_ylabel('Sum ADR (in million)')
-    ax.set_xticklabels(simulation_df['Scenario'], rotation=45, ha='right')  # corrected line
-
-    for bar in bars:
-        yval = bar.get_height()
-        ax.text(bar.get_x() + bar.get_width() / 2, yval + 0.1, round(yval, 2), ha='center', va='bottom')
-
-    st.pyplot(fig)
+    revenue_simulation_section(summary)
 
     st.markdown("""- Based on the cancellation analysis, hypothesis test results, and Average Daily Rate (ADR) for canceled bookings we've conducted, we can suggest several strategies to mitigate the cancellation rate:
 
@@ -348,20 +573,86 @@ def advanced_analysis(df):
 
 
 
-df = load_data()
-page = st.sidebar.selectbox("Choose Analysis Type", ["Introduction", "Overview", "Booking Analysis", "ADR Analysis", "Cancellation Analysis", "Guest Analysis", "Advanced Analysis"])
-
-if page == "Introduction":
-    introduction()
-elif page == "Overview":
-    overview(df)
-elif page == "Booking Analysis":
-    booking_analysis(df)
-elif page == "ADR Analysis":
-    adr_analysis(df)
-elif page == "Cancellation Analysis":
-    cancellation_analysis(df)
-elif page == "Guest Analysis":
-    guest_analysis(df)
-elif page == "Advanced Analysis":
-    advanced_analysis(df)
+# page: (render function, data it renders from)
+#   None     static content, nothing is loaded
+#   summary  the merged aggregates
+#   frame    the aggregates plus the raw rows (resampling tests)
+# Pages import matplotlib/seaborn themselves, and scipy is only imported by the functions
+# that use it, so a fresh process serving the Introduction loads neither those nor the data.
+PAGES = {
+    "Introduction": (introduction, None),
+    "Overview": (overview, 'summary'),
+    "Booking Analysis": (booking_analysis, 'summary'),
+    "ADR Analysis": (adr_analysis, 'summary'),
+    "Cancellation Analysis": (cancellation_analysis, 'summary'),
+    "Guest Analysis": (guest_analysis, 'summary'),
+    "Advanced Analysis": (advanced_analysis, 'frame'),
+}
+PAGE_NAMES = list(PAGES)
+
+def render_page(page, df=None, summary=None):
+    render, data = PAGES[page]
+    if data is None:
+        render()
+    elif summary['rows'] == 0:
+        st.warning('No bookings match the selected filters.')
+    elif data == 'summary':
+        render(summary)
+    else:
+        render(df, summary)
+
+# Time from the first script run in a server process until its page is rendered
+COLD_START_BUDGET_MS = float(os.environ.get('HOTEL_COLD_START_BUDGET_MS', 1500))
+logger = logging.getLogger(__name__)
+
+@st.cache_resource
+def first_run(_started):
+    # Cached for the life of the process, so this keeps the start time of the very first run
+    return {'started': _started, 'measured': False}
+
+def record_cold_start(cold_start, page):
+    if cold_start['measured']:
+        return
+    cold_start['measured'] = True
+    elapsed_ms = (time.perf_counter() - cold_start['started']) * 1000
+    # Part of this run's timings, so HOTEL_TIMINGS_LOG gets it whether or not it is over budget
+    timings.add('cold_start', elapsed_ms)
+    if elapsed_ms > COLD_START_BUDGET_MS:
+        logger.warning('cold start: %s rendered in %.0f ms, over the %.0f ms budget', page, elapsed_ms, COLD_START_BUDGET_MS)
+
+# Sections timed during this script run (Streamlit executes the script afresh on every run):
+# data loading, the page, and each chart. HOTEL_TIMINGS=1 lists them in the sidebar and
+# HOTEL_TIMINGS_LOG=<path> appends one JSON line per run to that file.
+timings = Timings()
+SHOW_TIMINGS = os.environ.get('HOTEL_TIMINGS', '0') not in ('', '0')
+TIMINGS_LOG = os.environ.get('HOTEL_TIMINGS_LOG')
+
+@st.cache_resource
+def timings_logger(path):
+    return json_lines_logger(path)
+
+def report_timings(page):
+    if SHOW_TIMINGS:
+        with st.sidebar.expander('Section timings (ms)'):
+            st.dataframe(pd.DataFrame(timings.sections, columns=['section', 'ms']).round(1), hide_index=True)
+    if TIMINGS_LOG:
+        timings_logger(TIMINGS_LOG).info(timings.record(page=page))
+
+def main(started):
+    cold_start = first_run(started)
+    page = st.sidebar.selectbox("Choose Analysis Type", PAGE_NAMES)
+    if PAGES[page][1] is None:
+        with timings.section(f'page/{page}'):
+            render_page(page)
+    else:
+        # Data is loaded (and the filters shown) only once a page needs it
+        with timings.section('load'):
+            df, summary = load_filtered()
+        with timings.section(f'page/{page}'):
+            render_page(page, df, summary)
+    record_cold_start(cold_start, page)
+    report_timings(page)
+
+# Streamlit runs the script as __main__; importing it (e.g. from report.py) has no side effects
+if __name__ == '__main__':
+    main(SCRIPT_STARTED)
@@ -0,0 +1,251 @@
+# Benchmarks data loading and every analysis page against synthetic bookings at multiples
+# of the 119,390-row dataset:
+#
+#     python benchmark.py --scales 1 10 100 --out benchmark.csv
+#
+# Besides the pages, it times what a sidebar filter change costs (the per-source indexes once,
+# then every summary piece of a few filtered views) and the permutation/bootstrap tests.
+# Every step records wall time and peak memory. Memory comes from a second run of the step
+# under tracemalloc (numpy and pandas report their buffers to it; worker processes are not
+# included), since its bookkeeping slows allocation-heavy code several times over. Charts are
+# timed one by one through the app's section timings, and rendered without the chart cache
+# so each page run draws everything.
+import argparse
+import importlib
+import os
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import report
+from report import app
+from bookings import MONTHS_ORDER
+from chart_cache import ChartCache
+from filters import build_filter_index, filter_mask
+from streaming import summarize_frame, summarize_source
+from subsets import SUBSET_PIECES, SubsetSummary, build_subset_index
+from timings import Timings
+
+# Imported before anything is timed so the first page does not also pay for them
+PAGE_MODULES = ['matplotlib.pyplot', 'seaborn', 'scipy.signal', 'scipy.stats']
+
+BASELINE_ROWS = 119390
+
+# Sidebar selections timed by the filter step: one large and one small subset
+FILTERS = {
+    'hotel': {'hotel': ['City Hotel']},
+    'country + segment': {'country': ['PRT', 'GBR'], 'market_segment': ['Online TA']},
+}
+SEASONS = {'December': 'Winter', 'January': 'Winter', 'February': 'Winter', 'March': 'Spring', 'April': 'Spring', 'May': 'Spring',
+           'June': 'Summer', 'July': 'Summer', 'August': 'Summer', 'September': 'Fall', 'October': 'Fall', 'November': 'Fall'}
+
+# value: probability, roughly as in the real data
+DISTRIBUTIONS = {
+    'hotel': {'City Hotel': 0.664, 'Resort Hotel': 0.336},
+    'meal': {'BB': 0.773, 'HB': 0.121, 'SC': 0.089, 'Undefined': 0.01, 'FB': 0.007},
+    'country': {'PRT': 0.41, 'GBR': 0.10, 'FRA': 0.09, 'ESP': 0.07, 'DEU': 0.06, 'ITA': 0.03, 'IRL': 0.03, 'BEL': 0.02,
+                'BRA': 0.02, 'NLD': 0.02, 'USA': 0.02, 'CHE': 0.015, 'CN': 0.01, 'AUT': 0.01, 'SWE': 0.01, 'CHN': 0.01,
+                'POL': 0.01, 'ISR': 0.005, 'RUS': 0.005, 'NOR': 0.005, 'OTHER': 0.05},
+    'market_segment': {'Online TA': 0.473, 'Offline TA/TO': 0.203, 'Groups': 0.166, 'Direct': 0.106, 'Corporate': 0.044,
+                       'Complementary': 0.006, 'Aviation': 0.002},
+    'distribution_channel': {'TA/TO': 0.82, 'Direct': 0.123, 'Corporate': 0.056, 'GDS': 0.001},
+    'reserved_room_type': {'A': 0.72, 'D': 0.161, 'E': 0.055, 'F': 0.024, 'G': 0.018, 'B': 0.009, 'C': 0.008, 'H': 0.005},
+    'deposit_type': {'No Deposit': 0.876, 'Non Refund': 0.122, 'Refundable': 0.002},
+    'customer_type': {'Transient': 0.75, 'Transient-Party': 0.211, 'Contract': 0.034, 'Group': 0.005},
+}
+
+def choice(rng, column, n):
+    values, p = zip(*DISTRIBUTIONS[column].items())
+    p = np.array(p) / sum(p)
+    return np.array(values, dtype=object)[rng.choice(len(values), size=n, p=p)]
+
+def synthetic_bookings(n, seed=None):
+    # n bookings with the columns of final_hotel_bookings.csv
+    rng = np.random.default_rng(seed)
+    year = rng.choice([2015, 2016, 2017], size=n, p=[0.18, 0.47, 0.35])
+    arrival = (year - 1970).astype('datetime64[Y]').astype('datetime64[D]') + rng.integers(0, 365, n)
+    month_index = arrival.astype('datetime64[M]').astype('int64') % 12
+    month = np.array(MONTHS_ORDER, dtype=object)[month_index]
+    day = (arrival - arrival.astype('datetime64[M]')).astype('int64') + 1
+    week = pd.DatetimeIndex(arrival).isocalendar().week.to_numpy(dtype='int64')
+
+    canceled = (rng.random(n) < 0.37).astype('int64')
+    lead_time = np.minimum(rng.exponential(104, n).astype('int64'), 737)
+    weekend_nights = rng.poisson(0.93, n)
+    week_nights = rng.poisson(2.5, n)
+    adults = rng.choice([1, 2, 3], size=n, p=[0.19, 0.75, 0.06])
+    children = rng.choice([0.0, 1.0, 2.0], size=n, p=[0.93, 0.04, 0.03])
+    babies = rng.choice([0, 1], size=n, p=[0.992, 0.008])
+    hotel = choice(rng, 'hotel', n)
+    reserved = choice(rng, 'reserved_room_type', n)
+    assigned = np.where(rng.random(n) < 0.12, choice(rng, 'reserved_room_type', n), reserved)
+    adr = np.round(rng.gamma(4, 25, n) + np.where(hotel == 'City Hotel', 10, 0), 2)
+
+    no_show = rng.random(n) < 0.03
+    status = np.where(canceled == 1, np.where(no_show, 'No-Show', 'Canceled'), 'Check-Out').astype(object)
+    nights = weekend_nights + week_nights
+    status_date = np.where(canceled == 1, arrival - (rng.random(n) * lead_time).astype('int64'), arrival + nights)
+    kids = children + babies
+    guest_type = np.select([kids > 0, adults == 1, adults == 2], ['Family', 'Single', 'Couple'], 'Group').astype(object)
+
+    return pd.DataFrame({
+        'hotel': hotel,
+        'is_canceled': canceled,
+        'lead_time': lead_time,
+        'arrival_date_year': year,
+        'arrival_date_month': month,
+        'arrival_date_week_number': week,
+        'arrival_date_day_of_month': day,
+        'stays_in_weekend_nights': weekend_nights,
+        'stays_in_week_nights': week_nights,
+        'adults': adults,
+        'children': children,
+        'babies': babies,
+        'meal': choice(rng, 'meal', n),
+        'country': choice(rng, 'country', n),
+        'market_segment': choice(rng, 'market_segment', n),
+        'distribution_channel': choice(rng, 'distribution_channel', n),
+        'is_repeated_guest': (rng.random(n) < 0.032).astype('int64'),
+        'previous_cancellations': rng.poisson(0.09, n),
+        'previous_bookings_not_canceled': rng.poisson(0.14, n),
+        'reserved_room_type': reserved,
+        'assigned_room_type': assigned,
+        'booking_changes': rng.poisson(0.22, n),
+        'deposit_type': choice(rng, 'deposit_type', n),
+        'days_in_waiting_list': np.where(rng.random(n) < 0.03, rng.exponential(80, n).astype('int64'), 0),
+        'customer_type': choice(rng, 'customer_type', n),
+        'adr': adr,
+        'required_car_parking_spaces': (rng.random(n) < 0.06).astype('int64'),
+        'total_of_special_requests': rng.poisson(0.57, n),
+        'reservation_status': status,
+        'reservation_status_date': np.datetime_as_string(status_date),
+        'guest_type': guest_type,
+        'season': np.vectorize(SEASONS.get, otypes=[object])(month),
+    })
+
+def write_dataset(path, rows, seed=0, chunk_rows=BASELINE_ROWS):
+    # Written chunk by chunk so a 100x dataset never has to fit in memory
+    tmp_path = path + '.tmp'
+    seeds = np.random.SeedSequence(seed).spawn((rows + chunk_rows - 1) // chunk_rows)
+    for i, child in enumerate(seeds):
+        chunk = synthetic_bookings(min(chunk_rows, rows - i * chunk_rows), child)
+        chunk.to_csv(tmp_path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+def measure(func, *args, trace_memory=True, reset=None):
+    # Returns (result of the timed run, wall ms, peak traced MB); reset() restores cold
+    # state before each run
+    if reset:
+        reset()
+    start = time.perf_counter()
+    result = func(*args)
+    wall_ms = (time.perf_counter() - start) * 1000
+    peak_mb = np.nan
+    if trace_memory:
+        if reset:
+            reset()
+        tracemalloc.start()
+        try:
+            func(*args)
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    return result, wall_ms, peak_mb
+
+def load(path):
+    # What the app does on a cold cache, without Streamlit's caching around it
+    version = app.source_version(path)
+    if app.streaming_mode(path):
+        df, summary = None, summarize_source(path)
+    else:
+        df = app.build_columnar_cache(path, version)
+        summary = summarize_frame(df)
+    summary['key'] = (path, version, ())
+    return df, summary
+
+def drop_columnar_cache(path):
+    cache_path = app.columnar_cache_path(path, app.source_version(path))
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+
+def build_indexes(df):
+    return build_filter_index(df), build_subset_index(df)
+
+def filter_summary(indexes, selections):
+    # A filter change: the mask, then every piece a page could read
+    filter_index, subset_index = indexes
+    summary = SubsetSummary(subset_index, filter_mask(filter_index, selections))
+    pieces = []
+    for name in SUBSET_PIECES:
+        start = time.perf_counter()
+        summary[name]
+        pieces.append((name, (time.perf_counter() - start) * 1000))
+    return pieces
+
+def resampling_tests(df, summary, n):
+    app.run_resampling_tests.clear()
+    return app.run_resampling_tests(df, None, summary['key'], n, n)
+
+def render(page, df, summary):
+    app.timings = Timings()
+    app.run_resampling_tests.clear()
+    report.record_page(page, df, summary)
+    return app.timings.sections
+
+def run_benchmarks(scales, pages, data_dir, trace_memory=True, seed=0, resamples=1000):
+    for module in PAGE_MODULES:
+        importlib.import_module(module)
+    app.chart_cache = lambda: ChartCache(0)
+    os.makedirs(data_dir, exist_ok=True)
+    results = []
+    for scale in scales:
+        rows = int(round(BASELINE_ROWS * scale))
+        path = os.path.join(data_dir, f'bookings-{scale:g}x.csv')
+        if not os.path.exists(path):
+            write_dataset(path, rows, seed)
+
+        def add(step, name, wall_ms, peak_mb=np.nan):
+            results.append({'scale': scale, 'rows': rows, 'step': step, 'name': name, 'wall_ms': wall_ms, 'peak_mb': peak_mb})
+            print(f'{scale:g}x  {step:<6} {name:<40} {wall_ms:10.1f} ms {peak_mb:10.1f} MB', flush=True)
+
+        (df, summary), wall_ms, peak_mb = measure(load, path, trace_memory=trace_memory, reset=lambda: drop_columnar_cache(path))
+        add('load', 'streaming' if df is None else 'in memory', wall_ms, peak_mb)
+        # Filters and the resampling tests need the rows, so streamed sources skip them
+        if df is not None:
+            indexes, wall_ms, peak_mb = measure(build_indexes, df, trace_memory=trace_memory)
+            add('filter', 'indexes', wall_ms, peak_mb)
+            for name, selections in FILTERS.items():
+                pieces, wall_ms, peak_mb = measure(filter_summary, indexes, selections, trace_memory=trace_memory)
+                add('filter', name, wall_ms, peak_mb)
+                for piece, piece_ms in pieces:
+                    add('piece', f'{name}/{piece}', piece_ms)
+            del indexes
+            if resamples:
+                _, wall_ms, peak_mb = measure(resampling_tests, df, summary, resamples, trace_memory=trace_memory)
+                add('tests', f'resampling x{resamples}', wall_ms, peak_mb)
+        for page in pages:
+            sections, wall_ms, peak_mb = measure(render, page, df, summary, trace_memory=trace_memory)
+            add('page', page, wall_ms, peak_mb)
+            for chart_id, chart_ms in sections:
+                add('chart', chart_id, chart_ms)
+    return pd.DataFrame(results)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time data loading and every page on synthetic bookings.')
+    parser.add_argument('--scales', nargs='+', type=float, default=[1, 10, 100], help=f'dataset sizes as multiples of {BASELINE_ROWS} rows')
+    parser.add_argument('--pages', nargs='+', choices=app.PAGE_NAMES, default=app.PAGE_NAMES)
+    parser.add_argument('--data-dir', default=os.path.join(app.CACHE_DIR, 'benchmark'), help='where the synthetic datasets are kept')
+    parser.add_argument('--out', default='benchmark.csv', help='CSV file for the results')
+    parser.add_argument('--no-memory', action='store_true', help='skip tracemalloc, which slows allocation-heavy steps')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--resamples', type=int, default=1000, help='permutations and bootstrap resamples to time (0 skips the tests)')
+    args = parser.parse_args(argv)
+    results = run_benchmarks(args.scales, args.pages, args.data_dir, not args.no_memory, args.seed, args.resamples)
+    results.to_csv(args.out, index=False)
+    print(results[~results['step'].isin(['chart', 'piece'])].pivot(index='name', columns='scale', values='wall_ms').round(1))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+MONTHS_ORDER = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
+CATEGORICAL_COLUMNS = ['hotel', 'country', 'market_segment', 'deposit_type', 'guest_type', 'season', 'arrival_date_month']
+
+CUBE_DIMENSIONS = ['hotel', 'country', 'market_segment', 'deposit_type', 'guest_type', 'arrival_date_month', 'season', 'is_canceled', 'is_repeated_guest']
+CUBE_MEASURES = ['bookings', 'adr_sum', 'adr_sq_sum', 'nights', 'revenue_sum', 'revenue_sq_sum']
+
+# Cube and stay dimensions use this in place of missing values, so no booking drops out
+MISSING_LABEL = 'Unknown'
+
+LEAD_TIME_BINS = [0, 60, 120, 180, 240, 300, 360, 420, 480, 540, 600, 660, np.inf]
+
+# column: (bins, kde)
+HISTOGRAM_SPEC = {
+    'lead_time': ('auto', True),
+    'adr': (30, False),
+    'arrival_date_day_of_month': (30, False),
+    'arrival_date_week_number': (30, False),
+}
+
+# Declared explicitly so helper columns added elsewhere never leak into the heatmap
+CORRELATION_COLUMNS = [
+    'is_canceled', 'lead_time', 'arrival_date_year', 'arrival_date_week_number', 'arrival_date_day_of_month',
+    'stays_in_weekend_nights', 'stays_in_week_nights', 'adults', 'children', 'babies', 'is_repeated_guest',
+    'previous_cancellations', 'previous_bookings_not_canceled', 'booking_changes', 'days_in_waiting_list',
+    'adr', 'required_car_parking_spaces', 'total_of_special_requests',
+]
+
+# Recorded after the booking is cancelled, so testing them against is_canceled is meaningless
+HYPOTHESIS_EXCLUDED = ['reservation_status', 'reservation_status_date']
+
+def optimize_dtypes(df):
+    for col in CATEGORICAL_COLUMNS:
+        if col not in df.columns:
+            continue
+        if col == 'arrival_date_month':
+            df[col] = pd.Categorical(df[col], categories=MONTHS_ORDER, ordered=True)
+        else:
+            df[col] = df[col].astype('category')
+    for col in df.select_dtypes(include='integer').columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    for col in df.select_dtypes(include='float').columns:
+        df[col] = pd.to_numeric(df[col], downcast='float')
+    return df
+
+def lead_time_category(lead_time):
+    return pd.cut(lead_time, LEAD_TIME_BINS, include_lowest=True)
+
+def stay_nights(df):
+    return df['stays_in_weekend_nights'].to_numpy(dtype='int64') + df['stays_in_week_nights'].to_numpy(dtype='int64')
+
+def label_missing(values):
+    # groupby drops NaN keys, and pandas 1.5 ignores dropna=False for categoricals with observed=True
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        if not values.isna().any():
+            return values
+        if MISSING_LABEL not in values.cat.categories:
+            values = values.cat.add_categories(MISSING_LABEL)
+        return values.fillna(MISSING_LABEL)
+    if values.dtype == object:
+        return values.fillna(MISSING_LABEL)
+    return values
+
+def booking_measures(df):
+    # A booking earns its ADR once per night of the stay
+    adr = df['adr'].astype('float64')
+    nights = pd.Series(stay_nights(df), index=df.index)
+    revenue = adr * nights
+    return pd.DataFrame({
+        'bookings': np.ones(len(df), dtype='int64'), 'adr_sum': adr, 'adr_sq_sum': adr * adr,
+        'nights': nights, 'revenue_sum': revenue, 'revenue_sq_sum': revenue * revenue,
+    }, index=df.index)
+
+def build_cube(df):
+    # One grouped pass over the raw rows; every booking/ADR chart is a roll-up of this
+    dims = [c for c in CUBE_DIMENSIONS if c in df.columns]
+    cube = booking_measures(df).groupby([label_missing(df[c]) for c in dims], observed=True).sum().reset_index()
+    if cube['bookings'].sum() != len(df):
+        raise ValueError(f"cube holds {cube['bookings'].sum()} of {len(df)} bookings; a dimension has missing values")
+    return cube
+
+def merge_cubes(cubes):
+    # Partial cubes from different chunks carry different category sets, so regroup on plain values
+    cubes = list(cubes)
+    dims = [c for c in cubes[0].columns if c not in CUBE_MEASURES]
+    merged = pd.concat(cubes, ignore_index=True)
+    for col in dims:
+        if isinstance(merged[col].dtype, pd.CategoricalDtype):
+            merged[col] = merged[col].astype(object)
+    merged = merged.groupby(dims, dropna=False)[CUBE_MEASURES].sum().reset_index()
+    # Only the dimensions go back to compact dtypes; float32 sums of squares lose the variance
+    return pd.concat([optimize_dtypes(merged[dims].copy()), merged[CUBE_MEASURES]], axis=1)
+
+def rollup(cube, by, **where):
+    # where: dimension=value filters, e.g. rollup(cube, 'country', is_canceled=1)
+    for col, value in where.items():
+        cube = cube[cube[col] == value]
+    agg = cube.groupby(by, observed=True)[CUBE_MEASURES].sum().sort_index()
+    agg['adr_mean'] = agg['adr_sum'] / agg['bookings']
+    # Undefined for a single booking; dividing by zero there would turn rounding noise into inf
+    variance = (agg['adr_sq_sum'] - agg['adr_sum'] ** 2 / agg['bookings']) / (agg['bookings'] - 1).where(agg['bookings'] > 1)
+    agg['adr_std'] = np.sqrt(variance.clip(lower=0))
+    # Plain labels so seaborn/pandas plot only the observed categories, in groupby order
+    if isinstance(agg.index, pd.MultiIndex):
+        agg.index = agg.index.set_levels([level.astype(object) for level in agg.index.levels])
+    else:
+        agg.index = agg.index.astype(object)
+    return agg
+
+def counts_by_cancellation(cube, by):
+    counts = rollup(cube, [by, 'is_canceled'])['bookings'].unstack(fill_value=0)
+    return pd.DataFrame({
+        'Total_Bookings': counts.sum(axis=1),
+        'Total_Cancellations': counts.get(1, 0)
+    })
+
+def lead_time_measures(df):
+    # Booking measures per (lead time category, is_canceled); also the lead time contingency table
+    return booking_measures(df).groupby([lead_time_category(df['lead_time']).rename('lead_time_category'), df['is_canceled']]).sum()
+
+def cancelled_strata(cube, lead_time, by=None):
+    # ADR and revenue sufficient statistics of the cancelled bookings, one row per segment
+    if by is None:
+        return rollup(cube, 'is_canceled', is_canceled=1)
+    if by == 'lead_time_category':
+        strata = lead_time.xs(1, level='is_canceled')
+        strata = strata[strata['bookings'] > 0]
+        strata.index = strata.index.astype(str)
+        return strata
+    return rollup(cube, by, is_canceled=1)
+
+def test_column_names(df):
+    return [c for c in df.select_dtypes(include=['category', 'object']).columns if c not in HYPOTHESIS_EXCLUDED]
@@ -0,0 +1,72 @@
+import io
+import threading
+from collections import OrderedDict
+
+DPI = 150
+
+def subplots(*args, figsize=None, **kwargs):
+    # Like plt.subplots(), but the figure is not registered with pyplot: pyplot's global
+    # figure list is not thread-safe, and an unregistered figure is simply garbage collected,
+    # even when drawing it fails halfway
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=figsize)
+    return fig, fig.subplots(*args, **kwargs)
+
+def figure_png(fig, dpi=DPI):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    return buffer.getvalue()
+
+class ChartCache:
+    # LRU cache of rendered chart PNGs, capped by total size in bytes.
+    #
+    # Streamlit runs every session in its own thread, so access is serialised with a lock.
+    # Drawing happens outside the lock; two sessions missing the same key at once both
+    # render it, which is cheaper than blocking every other chart behind one draw.
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            png = self._entries.get(key)
+            if png is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return png
+
+    def put(self, key, png):
+        if len(png) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = png
+            self.size += len(png)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def render(self, key, draw):
+        # draw() returns a new figure made with subplots(), so nothing needs closing
+        png = self.get(key)
+        if png is None:
+            png = figure_png(draw())
+            self.put(key, png)
+        return png
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
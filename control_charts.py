@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+
+from bookings import MONTHS_ORDER
+
+POINT_BUDGET = 2000
+
+def arrival_dates(df):
+    # Built with datetime64 arithmetic; pd.to_datetime on year/month/day columns is far slower
+    month = pd.Categorical(df['arrival_date_month'], categories=MONTHS_ORDER).codes
+    year = df['arrival_date_year'].to_numpy(dtype='int64')
+    day = df['arrival_date_day_of_month'].to_numpy(dtype='int64')
+    months = ((year - 1970) * 12 + month).astype('datetime64[M]')
+    dates = months.astype('datetime64[D]') + (day - 1)
+    dates[month < 0] = np.datetime64('NaT')
+    return dates
+
+def ewma(x, alpha, initial):
+    # z_t = alpha * x_t + (1 - alpha) * z_{t-1}, run as an IIR filter; returns the series
+    # and its last value so the next chunk can continue from it
+    from scipy.signal import lfilter
+    z, _ = lfilter([alpha], [1, -(1 - alpha)], x, zi=[(1 - alpha) * initial])
+    return z, (z[-1] if len(z) else initial)
+
+def cusum(x, target, k, initial=(0.0, 0.0)):
+    # Tabular CUSUM. S_t = max(0, S_{t-1} + x_t - target - k) is a reflected random walk,
+    # which equals C_t - min(C_0..C_t) for the cumulative sum C, so no loop is needed
+    upper_steps = np.cumsum(np.insert(x - target - k, 0, initial[0]))
+    lower_steps = np.cumsum(np.insert(target - k - x, 0, initial[1]))
+    upper = upper_steps - np.minimum(np.minimum.accumulate(upper_steps), 0)
+    lower = lower_steps - np.minimum(np.minimum.accumulate(lower_steps), 0)
+    return upper[1:], lower[1:]
+
+def control_chart(values, alpha=0.05, k=0.5, h=5.0, n_sigma=3, center=None, std=None):
+    # Statistics are in units of the series; k and h are in standard deviations. center and std
+    # default to the series' own mean and standard deviation (an individuals chart); pass the
+    # model values instead for e.g. a p-chart.
+    mean = values.mean() if center is None else center
+    if std is None:
+        std = values.std(ddof=1) if len(values) > 1 else 0.0
+    smoothed, _ = ewma(values, alpha, mean)
+    ewma_width = n_sigma * std * np.sqrt(alpha / (2 - alpha))
+    upper, lower = cusum(values, mean, k * std)
+    chart = pd.DataFrame({
+        'value': values,
+        'ewma': smoothed,
+        'cusum_upper': upper,
+        'cusum_lower': lower,
+    })
+    limits = {
+        'mean': mean,
+        'std': std,
+        'ucl': mean + n_sigma * std,
+        'lcl': mean - n_sigma * std,
+        'ewma_ucl': mean + ewma_width,
+        'ewma_lcl': mean - ewma_width,
+        'cusum_h': h * std,
+    }
+    return chart, limits
+
+def minmax_downsample(y, n_out=POINT_BUDGET):
+    # Keeps the min and max of each bucket, so spikes survive; returns sorted row positions
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    size = -(-n // max(n_out // 2, 1))
+    n_buckets = -(-n // size)
+    # Pad to equal-sized buckets so argmin/argmax run on a 2-D view
+    buckets = np.full(n_buckets * size, np.nan)
+    buckets[:n] = y
+    buckets = buckets.reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+    lows = offsets + np.nanargmin(buckets, axis=1)
+    highs = offsets + np.nanargmax(buckets, axis=1)
+    return np.unique(np.concatenate([lows, highs]))
+
+def lttb_downsample(y, n_out=POINT_BUDGET):
+    # Largest-Triangle-Three-Buckets on row position vs value; one vectorized step per output point
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype='float64')
+    edges = np.linspace(1, n - 1, n_out - 1).astype('int64')
+    selected = np.empty(n_out, dtype='int64')
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def downsample(chart, column='value', n_out=POINT_BUDGET, method='minmax'):
+    y = chart[column].to_numpy()
+    picker = lttb_downsample if method == 'lttb' else minmax_downsample
+    return chart.iloc[picker(y, n_out)]
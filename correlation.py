@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+class CorrelationAccumulator:
+    # Mergeable sufficient statistics for a pairwise-complete Pearson correlation matrix.
+    #
+    # Every statistic is a p x p matrix whose [i, j] entry only uses rows where both
+    # column i and column j are present, which is what DataFrame.corr() does. Chunks are
+    # combined with Chan's parallel update of means and co-moments, so adding a batch costs
+    # O(rows x p^2) for that batch and never rescans earlier ones.
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        p = len(self.columns)
+        self.n = np.zeros((p, p))
+        self.mean = np.zeros((p, p))     # mean of column i over rows where j is present
+        self.m2 = np.zeros((p, p))       # sum of squared deviations of column i, same rows
+        self.comoment = np.zeros((p, p))
+
+    def update(self, df):
+        return self.merge(self._from_chunk(df))
+
+    def _from_chunk(self, df):
+        x = df[self.columns].to_numpy(dtype='float64')
+        present = ~np.isnan(x)
+        counts = present.sum(axis=0)
+        # Centre on the chunk means first so the raw sums below do not lose precision
+        xc = np.where(present, x, 0.0)
+        shift = xc.sum(axis=0) / np.maximum(counts, 1)
+        xc -= shift
+        partial = np.flatnonzero(counts < len(x))
+        if len(partial):
+            xc[~present] = 0.0
+        gram = xc.T @ xc
+
+        # Over the rows where column j is present; start from all rows and take away the
+        # few rows where j is missing, so only columns with missing values cost anything extra
+        chunk = CorrelationAccumulator(self.columns)
+        p = len(self.columns)
+        n = np.repeat(counts[:, None].astype('float64'), p, axis=1)
+        sums = np.repeat(xc.sum(axis=0)[:, None], p, axis=1)
+        sq_sums = np.repeat(np.diag(gram)[:, None], p, axis=1)
+        for j in partial:
+            missing = xc[~present[:, j]]
+            n[:, j] -= present[~present[:, j]].sum(axis=0)
+            sums[:, j] -= missing.sum(axis=0)
+            sq_sums[:, j] -= (missing * missing).sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(n > 0, sums / n, 0.0)
+            chunk.m2 = np.where(n > 0, sq_sums - sums * mean, 0.0)
+            chunk.comoment = np.where(n > 0, gram - sums * mean.T, 0.0)
+        chunk.n = n
+        chunk.mean = mean + shift[:, None]
+        return chunk
+
+    def merge(self, other):
+        n = self.n + other.n
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weight = np.where(n > 0, self.n * other.n / n, 0.0)
+            delta = other.mean - self.mean
+            self.comoment = self.comoment + other.comoment + delta * delta.T * weight
+            self.m2 = self.m2 + other.m2 + delta * delta * weight
+            self.mean = np.where(n > 0, self.mean + delta * np.where(n > 0, other.n / n, 0.0), 0.0)
+        self.n = n
+        return self
+
+    def matrix(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = self.comoment / np.sqrt(self.m2 * self.m2.T)
+        corr[self.n < 2] = np.nan
+        np.fill_diagonal(corr, np.where(np.diag(self.m2) > 0, 1.0, np.nan))
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+    @classmethod
+    def from_sums(cls, columns, n, sums, products, shift):
+        # From the count, sums and cross products of rows with no missing values, every
+        # column taken minus `shift` so the sums stay small
+        accumulator = cls(columns)
+        if n == 0:
+            return accumulator
+        p = len(accumulator.columns)
+        mean = sums / n
+        accumulator.n = np.full((p, p), float(n))
+        accumulator.mean = np.repeat((mean + shift)[:, None], p, axis=1)
+        accumulator.m2 = np.repeat((np.diag(products) - sums * mean)[:, None], p, axis=1)
+        accumulator.comoment = products - np.outer(sums, mean)
+        return accumulator
+
+    @classmethod
+    def from_frame(cls, df, columns, chunk_size=100000):
+        accumulator = cls(columns)
+        for start in range(0, len(df), chunk_size):
+            accumulator.update(df.iloc[start:start + chunk_size])
+        return accumulator
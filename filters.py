@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from bookings import MONTHS_ORDER
+
+FILTER_COLUMNS = ['hotel', 'country', 'market_segment', 'deposit_type', 'customer_type', 'guest_type']
+PERIOD_COLUMN = 'arrival_period'
+
+def arrival_period(df):
+    # yyyymm integers sort chronologically, so a period range is a slice of the sorted values
+    month = pd.Categorical(df['arrival_date_month'], categories=MONTHS_ORDER).codes + 1
+    period = df['arrival_date_year'].to_numpy(dtype='int64') * 100 + month
+    return pd.Series(np.where(month > 0, period, -1), index=df.index, name=PERIOD_COLUMN)
+
+def period_label(period):
+    return f'{period // 100}-{period % 100:02d}'
+
+def build_filter_index(df, columns=FILTER_COLUMNS):
+    # One packed bitmap (1 bit per row) per distinct value of each filterable column
+    index = {'rows': len(df), 'bitmaps': {}}
+    sources = [df[c] for c in columns if c in df.columns] + [arrival_period(df)]
+    for series in sources:
+        codes, values = pd.factorize(series, sort=True)
+        index['bitmaps'][series.name] = {value: np.packbits(codes == i) for i, value in enumerate(values)}
+    return index
+
+def filter_values(index, column):
+    return list(index['bitmaps'].get(column, {}))
+
+def filter_mask(index, selections):
+    # selections: {column: selected values}. Values of one column are OR-ed, columns are
+    # AND-ed, all on packed bitmaps; returns a boolean row mask, or None when nothing is filtered
+    mask = None
+    for column, values in selections.items():
+        bitmaps = index['bitmaps'].get(column)
+        if not values or bitmaps is None:
+            continue
+        selected = [bitmaps[v] for v in values if v in bitmaps]
+        bits = np.bitwise_or.reduce(selected) if selected else np.zeros((index['rows'] + 7) // 8, dtype='uint8')
+        mask = bits if mask is None else mask & bits
+    if mask is None:
+        return None
+    return np.unpackbits(mask, count=index['rows']).astype(bool)
+
+def period_range(index, start, end):
+    return [p for p in filter_values(index, PERIOD_COLUMN) if start <= p <= end]
@@ -0,0 +1,139 @@
+import numpy as np
+
+KDE_GRID_SIZE = 1024
+
+def linear_weights(values, lo, hi, size=KDE_GRID_SIZE):
+    # Each value's left grid point and the share of its weight that goes to the right one
+    if hi <= lo:
+        return np.zeros(len(values), dtype='int64'), np.zeros(len(values))
+    pos = (values - lo) / (hi - lo) * (size - 1)
+    left = np.clip(np.floor(pos).astype('int64'), 0, size - 2)
+    return left, pos - left
+
+def linear_binning(values, lo, hi, size=KDE_GRID_SIZE):
+    # Splits each value's weight between its two neighbouring grid points
+    left, frac = linear_weights(values, lo, hi, size)
+    counts = np.bincount(left, weights=1 - frac, minlength=size) + np.bincount(left + 1, weights=frac, minlength=size)
+    return np.linspace(lo, hi, size), counts
+
+def fft_kde(grid, counts, bandwidth):
+    # Gaussian KDE on an even grid: binned counts convolved with the kernel sampled on the grid
+    delta = grid[1] - grid[0]
+    if bandwidth <= 0 or delta <= 0:
+        return np.zeros_like(counts)
+    half_width = min(int(np.ceil(4 * bandwidth / delta)), len(grid) - 1)
+    offsets = np.arange(-half_width, half_width + 1) * delta
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+    from scipy.signal import fftconvolve
+    density = fftconvolve(counts, kernel, mode='same') / counts.sum()
+    return np.clip(density, 0, None)
+
+def column_moments(values):
+    values = np.asarray(values, dtype='float64')
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return {'n': 0, 'min': np.inf, 'max': -np.inf, 'sum': 0.0, 'sq_sum': 0.0}
+    return {'n': len(values), 'min': values.min(), 'max': values.max(), 'sum': values.sum(), 'sq_sum': (values * values).sum()}
+
+def merge_moments(a, b):
+    return {'n': a['n'] + b['n'], 'min': min(a['min'], b['min']), 'max': max(a['max'], b['max']),
+            'sum': a['sum'] + b['sum'], 'sq_sum': a['sq_sum'] + b['sq_sum']}
+
+def auto_bins(moments):
+    # Like numpy's 'auto' (the finer of Sturges and Freedman-Diaconis), with Scott's rule standing
+    # in for Freedman-Diaconis because it needs the standard deviation rather than quantiles.
+    # Only uses moments, so in-memory and streamed summaries get the same bins.
+    n, lo, hi = moments['n'], moments['min'], moments['max']
+    sturges = int(np.ceil(np.log2(max(n, 1)))) + 1
+    if n < 2 or hi <= lo:
+        return sturges
+    var = (moments['sq_sum'] - moments['sum'] ** 2 / n) / (n - 1)
+    width = 3.49 * np.sqrt(max(var, 0)) * n ** (-1 / 3)
+    return max(sturges, int(np.ceil((hi - lo) / width))) if width > 0 else sturges
+
+def kde_bandwidth(moments):
+    # Scott's rule, the default of scipy's gaussian_kde (and so seaborn)
+    n = moments['n']
+    var = (moments['sq_sum'] - moments['sum'] ** 2 / n) / (n - 1)
+    return np.sqrt(max(var, 0)) * n ** (-1 / 5)
+
+def histogram_layout(moments, bins=30, kde=False):
+    # Fixes bin edges (and the KDE grid) up front so counts from separate chunks line up
+    n, lo, hi = moments['n'], moments['min'], moments['max']
+    if isinstance(bins, str):
+        bins = auto_bins(moments)
+    edges = np.linspace(lo, hi, bins + 1) if hi > lo else np.array([lo - 0.5, lo + 0.5])
+    layout = {'edges': edges}
+    if kde and n > 1:
+        bandwidth = kde_bandwidth(moments)
+        # Pad the grid so the density can taper off past the data range
+        layout['bandwidth'] = bandwidth
+        layout['grid_range'] = (lo - 3 * bandwidth, hi + 3 * bandwidth)
+    return layout
+
+def partial_histogram(values, layout):
+    values = np.asarray(values, dtype='float64')
+    values = values[np.isfinite(values)]
+    counts, _ = np.histogram(values, bins=layout['edges'])
+    partial = {'counts': counts, 'n': len(values)}
+    if 'grid_range' in layout:
+        _, partial['grid_counts'] = linear_binning(values, *layout['grid_range'])
+    return partial
+
+def merge_partial_histograms(a, b):
+    merged = {'counts': a['counts'] + b['counts'], 'n': a['n'] + b['n']}
+    if 'grid_counts' in a:
+        merged['grid_counts'] = a['grid_counts'] + b['grid_counts']
+    return merged
+
+def finalize_histogram(layout, partial):
+    histogram = {'counts': partial['counts'], 'edges': layout['edges'], 'n': partial['n']}
+    if 'grid_counts' in partial and partial['n']:
+        grid = np.linspace(*layout['grid_range'], KDE_GRID_SIZE)
+        histogram['grid'] = grid
+        histogram['density'] = fft_kde(grid, partial['grid_counts'], layout['bandwidth'])
+    return histogram
+
+def column_histogram(values, bins=30, kde=False):
+    values = np.asarray(values, dtype='float64')
+    values = values[np.isfinite(values)]
+    layout = histogram_layout(column_moments(values), bins, kde)
+    return finalize_histogram(layout, partial_histogram(values, layout))
+
+def build_histograms(df, spec):
+    # spec: {column: (bins, kde)}
+    return {column: column_histogram(df[column], bins, kde) for column, (bins, kde) in spec.items() if column in df.columns}
+
+def histogram_rows(values, layout):
+    # Bin and KDE grid position of every value under a fixed layout, so the histogram of any
+    # subset of them is a few bincounts. Missing values go to a spare bin and grid point.
+    values = np.asarray(values, dtype='float64')
+    finite = np.isfinite(values)
+    edges = layout['edges']
+    n_bins = len(edges) - 1
+    bins = np.clip(np.searchsorted(edges, values, side='right') - 1, 0, n_bins - 1)
+    rows = {'bins': np.where(finite, bins, n_bins)}
+    if 'grid_range' in layout:
+        left, frac = linear_weights(np.where(finite, values, 0), *layout['grid_range'])
+        rows['left'] = np.where(finite, left, KDE_GRID_SIZE)
+        rows['frac'] = np.where(finite, frac, 0.0)
+    return rows
+
+def subset_histogram(layout, counts, moments, grid_counts=None):
+    # Keeps the bin edges of the full data, so filtered histograms share its axes; the KDE
+    # bandwidth follows the subset's moments
+    layout = dict(layout)
+    partial = {'counts': counts, 'n': moments['n']}
+    if grid_counts is not None and 'grid_range' in layout and moments['n'] > 1:
+        layout['bandwidth'] = kde_bandwidth(moments)
+        partial['grid_counts'] = grid_counts
+    return finalize_histogram(layout, partial)
+
+def plot_histogram(histogram, ax, color=None):
+    # Draws pre-binned counts; the KDE is scaled to counts like seaborn's histplot(kde=True)
+    edges, counts = histogram['edges'], histogram['counts']
+    ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge', color=color, alpha=0.75, edgecolor='white', linewidth=0.5)
+    if 'density' in histogram:
+        scale = histogram['n'] * np.diff(edges).mean()
+        ax.plot(histogram['grid'], histogram['density'] * scale, color=color)
+    ax.set_ylabel('Count')
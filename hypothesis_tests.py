@@ -0,0 +1,177 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+CHUNK_SIZE = 250
+
+def encode(series):
+    # Integer codes per category; missing values get -1 and are left out of every table
+    codes, categories = pd.factorize(series, sort=True)
+    return codes, categories
+
+def contingency_table(codes, outcome, n_categories):
+    # k x 2 table of (category, outcome) counts from a single bincount
+    valid = codes >= 0
+    flat = codes[valid].astype('int64') * 2 + outcome[valid].astype('int64')
+    return np.bincount(flat, minlength=n_categories * 2).reshape(n_categories, 2)
+
+def binary_chi2(totals, positives):
+    # Pearson statistic (no Yates correction) of a k x 2 table given per-category
+    # totals and outcome==1 counts
+    keep = totals > 0
+    totals, positives = totals[keep], positives[keep]
+    p = positives.sum() / totals.sum()
+    if p <= 0 or p >= 1:
+        return 0.0
+    expected = totals * p
+    return ((positives - expected) ** 2 / (expected * (1 - p))).sum()
+
+def adjust_pvalues(p_values, method='holm'):
+    p = np.asarray(p_values, dtype='float64')
+    n = len(p)
+    if n == 0 or method is None:
+        return p
+    if method == 'bonferroni':
+        return np.minimum(p * n, 1)
+    order = np.argsort(p)
+    ranked = p[order]
+    if method == 'holm':
+        adjusted = np.maximum.accumulate(ranked * (n - np.arange(n)))
+    elif method == 'fdr_bh':
+        adjusted = np.minimum.accumulate((ranked * n / np.arange(1, n + 1))[::-1])[::-1]
+    else:
+        raise ValueError(f"Unknown correction method: {method}")
+    result = np.empty(n)
+    result[order] = np.minimum(adjusted, 1)
+    return result
+
+def contingency_frame(series, outcome):
+    # Category x outcome(0/1) counts, labelled so tables from different chunks can be added
+    codes, categories = encode(series)
+    table = contingency_table(codes, np.asarray(outcome), len(categories))
+    return pd.DataFrame(table, index=pd.Index(np.asarray(categories), name=series.name), columns=[0, 1])
+
+def chi_square_from_tables(tables, correction='holm', alpha=0.05):
+    # tables: {name: k x 2 table of counts}, e.g. merged from chunked contingency_frame() calls
+    from scipy.stats import chi2
+    rows = []
+    for name, table in tables.items():
+        table = np.asarray(table)
+        table = table[table.sum(axis=1) > 0]
+        stat = binary_chi2(table.sum(axis=1), table[:, 1])
+        dof = max(len(table) - 1, 0)
+        n = table.sum()
+        rows.append({
+            'column': name,
+            'categories': len(table),
+            'chi2': stat,
+            'dof': dof,
+            'p_value': chi2.sf(stat, dof) if dof else 1.0,
+            'cramers_v': np.sqrt(stat / n) if n else 0.0,
+        })
+    results = pd.DataFrame(rows)
+    results['p_adjusted'] = adjust_pvalues(results['p_value'], correction)
+    results['significant'] = results['p_adjusted'] < alpha
+    return results.set_index('column')
+
+def column_chi2(totals, positives, column_of, n_columns):
+    # binary_chi2 of several k x 2 tables at once; bins of every table sit side by side and
+    # column_of maps each bin to its table
+    n = np.bincount(column_of, weights=totals, minlength=n_columns)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = (np.bincount(column_of, weights=positives, minlength=n_columns) / n)[column_of]
+        expected = totals * p
+        variance = expected * (1 - p)
+        terms = np.where(variance > 0, (positives - expected) ** 2 / variance, 0.0)
+    return np.bincount(column_of, weights=terms, minlength=n_columns)
+
+def _permutation_chunk(codes, column_of, totals, n_positive, n_permutations, seed):
+    # codes: rows x columns bin numbers, missing values in a trailing bin. A permutation of the
+    # outcome is a random set of n_positive rows, drawn once per permutation for all columns.
+    rng = np.random.default_rng(seed)
+    n_rows = len(codes)
+    n_bins = len(totals)
+    n_columns = column_of.max() + 1
+    # Counting the smaller side is enough; the other follows from the totals
+    flip = n_positive > n_rows // 2
+    stats = np.empty((n_permutations, n_columns))
+    for i in range(n_permutations):
+        rows = rng.choice(n_rows, n_rows - n_positive if flip else n_positive, replace=False, shuffle=False)
+        counts = np.bincount(codes[rows].ravel(), minlength=n_bins + 1)[:n_bins]
+        stats[i] = column_chi2(totals, totals - counts if flip else counts, column_of, n_columns)
+    return stats
+
+def _bootstrap_chunk(values, group, n_resamples, seed):
+    # A resample is the number of times each row was drawn, so no resampled copy is built.
+    # values is columns x rows; every resample weights all columns alike.
+    rng = np.random.default_rng(seed)
+    n_rows = values.shape[1]
+    diffs = np.empty((n_resamples, len(values)))
+    for i in range(n_resamples):
+        weights = np.bincount(rng.integers(0, n_rows, n_rows), minlength=n_rows)
+        w1 = weights * group
+        w0 = weights - w1
+        diffs[i] = (values @ w1) / w1.sum() - (values @ w0) / w0.sum()
+    return diffs
+
+# Inputs of the chunk functions in pool workers, sent once per worker by _init_worker
+_shared = {}
+
+def _init_worker(func, args):
+    _shared[func] = args
+
+def _shared_chunk(func, size, seed):
+    return func(*_shared[func], size, seed)
+
+def _run_chunks(func, args, total, seed, n_jobs=None):
+    # Work is cut into fixed-size chunks with their own spawned seeds, so the result
+    # only depends on the seed and not on how many processes ran it. Workers receive args
+    # once through the pool initializer rather than with every chunk.
+    sizes = [min(CHUNK_SIZE, total - start) for start in range(0, total, CHUNK_SIZE)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if n_jobs == 1 or len(sizes) == 1:
+        return np.concatenate([func(*args, size, s) for size, s in zip(sizes, seeds)])
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(sizes))
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(func, args)) as pool:
+        return np.concatenate(list(pool.map(_shared_chunk, [func] * len(sizes), sizes, seeds)))
+
+def permutation_tests(columns, outcome, n_permutations=10000, seed=0, n_jobs=None):
+    # Permutation p-values of the chi-square statistic between each categorical column and a
+    # binary outcome. The outcome is permuted across all rows; a column's missing values are
+    # left out of its statistic.
+    y = np.asarray(outcome, dtype='int64')
+    encoded = [encode(series) for series in columns]
+    sizes = [len(categories) for _, categories in encoded]
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    n_bins = int(offsets[-1])
+    codes = np.empty((len(y), len(encoded)), dtype='int32')
+    for i, (column_codes, _) in enumerate(encoded):
+        codes[:, i] = np.where(column_codes >= 0, column_codes + offsets[i], n_bins)
+    column_of = np.repeat(np.arange(len(encoded)), sizes)
+    totals = np.bincount(codes.ravel(), minlength=n_bins + 1)[:n_bins]
+    positives = np.bincount(codes[y == 1].ravel(), minlength=n_bins + 1)[:n_bins]
+    observed = column_chi2(totals, positives, column_of, len(encoded))
+    stats = _run_chunks(_permutation_chunk, (codes, column_of, totals, int(y.sum())), n_permutations, seed, n_jobs)
+    p_values = (1 + (stats >= observed).sum(axis=0)) / (1 + n_permutations)
+    return pd.DataFrame({'chi2': observed, 'p_value': p_values, 'n_permutations': n_permutations},
+                        index=pd.Index([series.name for series in columns]))
+
+def bootstrap_mean_differences(columns, group, n_resamples=2000, confidence=0.95, seed=0, n_jobs=None):
+    # Bootstrap CIs of mean(values | group == 1) - mean(values | group == 0) for each column
+    values = np.vstack([np.asarray(series, dtype='float64') for series in columns])
+    group = np.asarray(group, dtype='int64')
+    observed = values[:, group == 1].mean(axis=1) - values[:, group == 0].mean(axis=1)
+    diffs = _run_chunks(_bootstrap_chunk, (values, group), n_resamples, seed, n_jobs)
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(diffs, [tail, 100 - tail], axis=0)
+    # Two-sided p-value from the bootstrap distribution re-centred on zero
+    p_values = (1 + (np.abs(diffs - diffs.mean(axis=0)) >= np.abs(observed)).sum(axis=0)) / (1 + n_resamples)
+    return pd.DataFrame({'difference': observed, 'ci_low': low, 'ci_high': high, 'p_value': p_values, 'n_resamples': n_resamples},
+                        index=pd.Index([series.name for series in columns]))
+
+def resampling_tests(categorical, numeric, outcome, n_permutations=10000, n_resamples=2000, seed=0, n_jobs=None):
+    # n_jobs worker processes (all cores by default, 1 runs in this process) for each batch
+    return (permutation_tests(categorical, outcome, n_permutations, seed, n_jobs),
+            bootstrap_mean_differences(numeric, outcome, n_resamples, seed=seed, n_jobs=n_jobs))
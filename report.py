@@ -0,0 +1,240 @@
+# Renders every page of Hotel_Analysis_app to static HTML + PNG bundles without a browser:
+#
+#     python report.py final_hotel_bookings.csv --by-hotel --out reports --jobs 8
+#
+# Each source is loaded and summarised once; the pages of all bundles are then rendered
+# in parallel by a process pool that receives the datasets once per worker.
+import argparse
+import html
+import os
+import re
+import sys
+import textwrap
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+import matplotlib
+matplotlib.use('Agg')
+
+import streamlit
+import Hotel_Analysis_app as app
+from filters import build_filter_index, filter_mask
+from streaming import summarize_frame, summarize_source
+
+def slugify(text):
+    return re.sub(r'[^a-z0-9]+', '-', str(text).lower()).strip('-')
+
+class PageRecorder:
+    # Stands in for the streamlit module while a page renders: output calls are recorded
+    # as HTML blocks and images, and widgets return their default values
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.blocks = []
+        self.images = []
+        self.sidebar = self
+
+    def _text(self, tag, text):
+        self.blocks.append(f'<{tag}>{html.escape(str(text))}</{tag}>')
+
+    def title(self, text, **kwargs):
+        self._text('h1', text)
+
+    def header(self, text, **kwargs):
+        self._text('h2', text)
+
+    def subheader(self, text, **kwargs):
+        self._text('h3', text)
+
+    def markdown(self, text, **kwargs):
+        body = html.escape(textwrap.dedent(text).strip())
+        body = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', body)
+        self.blocks.append(f'<div class="markdown">{body}</div>')
+
+    def caption(self, text, **kwargs):
+        self._text('p class="caption"', text)
+
+    def info(self, text, **kwargs):
+        self._text('p class="info"', text)
+
+    def warning(self, text, **kwargs):
+        self._text('p class="warning"', text)
+
+    def error(self, text, **kwargs):
+        self._text('pre class="error"', text)
+
+    def image(self, image, caption=None, **kwargs):
+        if isinstance(image, str):
+            if not os.path.exists(image):
+                return
+            extension = os.path.splitext(image)[1] or '.png'
+            with open(image, 'rb') as f:
+                image = f.read()
+        else:
+            extension = '.png'
+        name = f'{self.prefix}-{len(self.images) + 1}{extension}'
+        self.images.append((name, image))
+        self.blocks.append(f'<img src="{name}" alt="{html.escape(caption or name)}">')
+        if caption:
+            self.caption(caption)
+
+    def dataframe(self, data, **kwargs):
+        self.blocks.append(data.to_html(float_format=lambda v: f'{v:.4g}'))
+
+    table = dataframe
+
+    def selectbox(self, label, options, index=0, **kwargs):
+        return list(options)[index]
+
+    def multiselect(self, label, options, default=None, **kwargs):
+        return list(default or [])
+
+    def select_slider(self, label, options=(), value=None, **kwargs):
+        return value if value is not None else list(options)[0]
+
+    def number_input(self, label, min_value=None, max_value=None, value=None, *args, **kwargs):
+        return value
+
+    def checkbox(self, label, value=False, **kwargs):
+        return value
+
+    def expander(self, label, **kwargs):
+        return nullcontext(self)
+
+    def spinner(self, text='', **kwargs):
+        return nullcontext(self)
+
+_datasets = {}
+
+def _init_worker(datasets):
+    _datasets.update(datasets)
+
+def record_page(page, df, summary, recorder=None):
+    recorder = recorder or PageRecorder(slugify(page))
+    app.st = recorder
+    try:
+        app.render_page(page, df, summary)
+    finally:
+        app.st = streamlit
+    return recorder
+
+def render_page(bundle, page):
+    # A page that fails keeps what it rendered so far plus the traceback, and the run goes on
+    recorder = PageRecorder(slugify(page))
+    error = None
+    try:
+        record_page(page, *_datasets[bundle], recorder=recorder)
+    except Exception:
+        error = traceback.format_exc()
+        recorder.error(error)
+    return bundle, page, recorder.blocks, recorder.images, error
+
+def load_bundles(path, by_hotel=False):
+    # Returns {bundle name: (df, summary)} for one source, reading it only once
+    name = slugify(os.path.splitext(os.path.basename(path))[0])
+    version = app.source_version(path)
+    if app.streaming_mode(path):
+        # Too large to hold in memory: one bundle from the merged chunk summaries
+        summary = summarize_source(path)
+        summary['key'] = (path, version, ())
+        return {name: (None, summary)}
+
+    df = app.build_columnar_cache(path, version)
+    if not by_hotel:
+        summary = summarize_frame(df)
+        summary['key'] = (path, version, ())
+        return {name: (df, summary)}
+
+    index = build_filter_index(df)
+    bundles = {}
+    for hotel in index['bitmaps']['hotel']:
+        subset = df[filter_mask(index, {'hotel': [hotel]})].reset_index(drop=True)
+        summary = summarize_frame(subset)
+        summary['key'] = (path, version, (('hotel', (hotel,)),))
+        add_bundle(bundles, f'{name}-{slugify(hotel)}', (subset, summary))
+    return bundles
+
+def add_bundle(bundles, name, dataset):
+    # Bundle names become output directories, so a repeated name would overwrite a bundle
+    if name in bundles:
+        raise ValueError(f"bundle {name!r} of {dataset[1]['key'][0]} would overwrite the one of "
+                         f"{bundles[name][1]['key'][0]}; rename one of the sources")
+    bundles[name] = dataset
+
+def write_bundle(out_dir, bundle, pages):
+    # pages: [(page name, html blocks, images)] in PAGE_NAMES order
+    bundle_dir = os.path.join(out_dir, bundle)
+    os.makedirs(bundle_dir, exist_ok=True)
+    nav = ' | '.join(f'<a href="#{slugify(page)}">{html.escape(page)}</a>' for page, _, _ in pages)
+    sections = []
+    for page, blocks, images in pages:
+        for name, data in images:
+            with open(os.path.join(bundle_dir, name), 'wb') as f:
+                f.write(data)
+        sections.append(f'<section id="{slugify(page)}">\n' + '\n'.join(blocks) + '\n</section>')
+    with open(os.path.join(bundle_dir, 'index.html'), 'w', encoding='utf-8') as f:
+        f.write(REPORT_TEMPLATE.format(title=html.escape(bundle), nav=nav, body='\n<hr>\n'.join(sections)))
+    return bundle_dir
+
+REPORT_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: sans-serif; max-width: 1100px; margin: auto; padding: 1em; }}
+img {{ max-width: 100%; }}
+.markdown {{ white-space: pre-wrap; }}
+.caption {{ color: #666; font-size: 0.9em; }}
+.error {{ color: #b00; white-space: pre-wrap; }}
+table {{ border-collapse: collapse; font-size: 0.85em; }}
+td, th {{ border: 1px solid #ddd; padding: 2px 6px; }}
+</style>
+</head>
+<body>
+<nav>{nav}</nav>
+{body}
+</body>
+</html>
+"""
+
+def generate_reports(sources, out_dir, by_hotel=False, jobs=None, pages=None):
+    pages = pages or app.PAGE_NAMES
+    datasets = {}
+    for path in sources:
+        for name, dataset in load_bundles(path, by_hotel).items():
+            add_bundle(datasets, name, dataset)
+
+    tasks = [(bundle, page) for bundle in datasets for page in pages]
+    results = {bundle: {} for bundle in datasets}
+    if jobs == 1:
+        _init_worker(datasets)
+        rendered = map(lambda task: render_page(*task), tasks)
+    else:
+        pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(datasets,))
+        rendered = pool.map(render_page, *zip(*tasks))
+    try:
+        for bundle, page, blocks, images, error in rendered:
+            results[bundle][page] = (blocks, images)
+            if error:
+                print(f'{bundle}: {page} failed\n{error}', file=sys.stderr)
+    finally:
+        if jobs != 1:
+            pool.shutdown()
+
+    return [write_bundle(out_dir, bundle, [(page, *results[bundle][page]) for page in pages]) for bundle in datasets]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render every analysis page to static HTML/PNG bundles.')
+    parser.add_argument('sources', nargs='*', default=[app.DATA_PATH], help='bookings CSV or Parquet files (one bundle each)')
+    parser.add_argument('--out', default='reports', help='output directory')
+    parser.add_argument('--by-hotel', action='store_true', help='write one bundle per hotel instead of per source')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--pages', nargs='+', choices=app.PAGE_NAMES, help='only render these pages')
+    args = parser.parse_args(argv)
+    for bundle_dir in generate_reports(args.sources, args.out, args.by_hotel, args.jobs, args.pages):
+        print(os.path.join(bundle_dir, 'index.html'))
+
+if __name__ == '__main__':
+    main()
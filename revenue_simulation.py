@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+def stratum_stats(strata, measure='revenue'):
+    # strata: one row per segment of cancelled bookings with bookings, <measure>_sum, <measure>_sq_sum
+    n = strata['bookings'].to_numpy(dtype='int64')
+    total = strata[f'{measure}_sum'].to_numpy(dtype='float64')
+    mean = np.divide(total, n, out=np.zeros(len(n)), where=n > 0)
+    # Population variance of the per-booking value inside each stratum
+    var = np.divide(strata[f'{measure}_sq_sum'].to_numpy(dtype='float64'), n, out=np.zeros(len(n)), where=n > 0) - mean ** 2
+    return n, mean, np.clip(var, 0, None)
+
+def simulate_conversions(strata, rates, n_scenarios=10000, seed=None, batch_size=50000, measure='revenue'):
+    # Draws the extra revenue (ADR x nights, or any other per-booking measure) earned if each
+    # cancelled booking converts with its segment's rate.
+    #
+    # Rather than one Bernoulli draw per booking, each stratum draws how many bookings
+    # convert (K ~ Binomial(N, p)) and then the value sum of a random K-subset, which has
+    # mean K*mu and variance K*sigma^2*(N-K)/(N-1). Cost is O(scenarios x strata),
+    # independent of the number of bookings.
+    n, mean, var = stratum_stats(strata, measure)
+    rates = np.broadcast_to(np.asarray(rates, dtype='float64'), n.shape)
+    if ((rates < 0) | (rates > 1)).any():
+        raise ValueError("Conversion rates must be between 0 and 1")
+
+    rng = np.random.default_rng(seed)
+    totals = strata[f'{measure}_sum'].to_numpy(dtype='float64')
+    draws = np.empty(n_scenarios)
+    for start in range(0, n_scenarios, batch_size):
+        size = min(batch_size, n_scenarios - start)
+        k = rng.binomial(n, rates, size=(size, len(n)))
+        fpc = np.divide(n - k, n - 1, out=np.zeros(k.shape), where=n > 1)
+        revenue = k * mean + rng.standard_normal(k.shape) * np.sqrt(k * var * fpc)
+        draws[start:start + size] = np.clip(revenue, 0, totals).sum(axis=1)
+    return draws
+
+def summarize(draws, percentiles=PERCENTILES):
+    summary = pd.Series(np.percentile(draws, percentiles), index=[f'p{p}' for p in percentiles])
+    summary['mean'] = draws.mean()
+    return summary
+
+def run_scenarios(strata, scenarios, n_scenarios=10000, seed=None, measure='revenue'):
+    # scenarios: {label: rate or per-stratum array of rates}; returns one summary row per label
+    seeds = np.random.SeedSequence(seed).spawn(len(scenarios))
+    rows = {}
+    for (label, rates), child in zip(scenarios.items(), seeds):
+        rows[label] = summarize(simulate_conversions(strata, rates, n_scenarios, seed=child, measure=measure))
+    return pd.DataFrame(rows).T
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+from bookings import MONTHS_ORDER, label_missing, stay_nights
+from control_charts import arrival_dates
+
+STAY_DIMENSIONS = ['hotel', 'market_segment', 'is_canceled']
+STAY_MEASURES = ['room_nights', 'revenue']
+
+def stay_layout(df, by=STAY_DIMENSIONS):
+    # Per booking: its group of `by` and the first and last night as offsets in a shared date
+    # range, which is all stays_for_rows() needs. Bookings without a stay get group -1.
+    dims = [c for c in by if c in df.columns]
+    arrival = arrival_dates(df)
+    nights = stay_nights(df)
+    keep = ~np.isnat(arrival) & (nights > 0)
+    layout = {'dims': dims, 'adr': df['adr'].to_numpy(dtype='float64')}
+    if not keep.any():
+        return {**layout, 'group': np.full(len(df), -1), 'keys': None}
+    codes, keys = pd.MultiIndex.from_arrays([label_missing(df[c]) for c in dims]).factorize()
+    codes = np.where(keep, codes, -1)
+    origin = arrival[keep].min()
+    first = np.where(keep, (arrival - origin).astype('int64'), 0)
+    last = first + nights
+    n_dates = int(last[keep].max()) + 1
+    # Flat positions in the (groups x dates) difference arrays of stays_for_rows
+    return {**layout, 'group': codes, 'keys': keys, 'origin': origin, 'n_dates': n_dates,
+            'first': codes * n_dates + first, 'last': codes * n_dates + last}
+
+def empty_stays(dims):
+    index = pd.MultiIndex.from_arrays([pd.DatetimeIndex([])] + [[]] * len(dims), names=['stay_date'] + dims)
+    return pd.DataFrame({'room_nights': np.zeros(0, dtype='int64'), 'revenue': np.zeros(0)}, index=index)
+
+def stays_for_rows(layout, rows=None):
+    # Room-nights and revenue per night of stay for the bookings at positions `rows` (all by
+    # default). A booking occupies the nights [arrival, arrival + nights) and earns its ADR
+    # on each of them.
+    #
+    # Instead of one row per night, every booking adds +1/+ADR at its arrival and -1/-ADR at
+    # its departure in a (groups x dates) difference array; a cumulative sum along the dates
+    # then gives the nightly totals. Memory is O(bookings + groups x dates), not O(nights).
+    group = layout['group'] if rows is None else layout['group'][rows]
+    keep = group >= 0
+    if not keep.any():
+        return empty_stays(layout['dims'])
+    if rows is None:
+        rows = np.arange(len(group))
+    rows = rows[keep]
+    first, last, adr = layout['first'][rows], layout['last'][rows], layout['adr'][rows]
+    size = len(layout['keys']) * layout['n_dates']
+    bookings = np.bincount(first, minlength=size) - np.bincount(last, minlength=size)
+    revenue = np.bincount(first, weights=adr, minlength=size) - np.bincount(last, weights=adr, minlength=size)
+    return stays_from_changes(layout, bookings, revenue)
+
+def stays_from_changes(layout, bookings, revenue):
+    # bookings, revenue: arrivals minus departures (and their ADR) at each flat position of
+    # the (groups x dates) difference arrays
+    dims = layout['dims']
+    if layout['keys'] is None:
+        return empty_stays(dims)
+    shape = (len(layout['keys']), layout['n_dates'])
+    room_nights = np.cumsum(bookings.reshape(shape), axis=1)
+    revenue = np.cumsum(revenue.reshape(shape), axis=1)
+
+    group, day = np.nonzero(room_nights)
+    stays = {'stay_date': layout['origin'] + day}
+    for i, col in enumerate(dims):
+        # Plain values so partial results from different chunks line up when added
+        stays[col] = np.asarray(layout['keys'].get_level_values(i), dtype=object)[group]
+    stays['room_nights'] = room_nights[group, day]
+    stays['revenue'] = revenue[group, day]
+    return pd.DataFrame(stays).set_index(['stay_date'] + dims).sort_index()
+
+def daily_stays(df, by=STAY_DIMENSIONS):
+    return stays_for_rows(stay_layout(df, by))
+
+def stay_rollup(stays, by, **where):
+    # where: dimension=value filters, e.g. stay_rollup(stays, 'stay_month', is_canceled=0).
+    # Besides the stay dimensions, by can use 'stay_date' and 'stay_month' (month of the night).
+    for col, value in where.items():
+        stays = stays[stays.index.get_level_values(col) == value]
+    stays = stays.reset_index()
+    stays['stay_month'] = pd.Categorical(stays['stay_date'].dt.month_name(), categories=MONTHS_ORDER, ordered=True)
+    return stays.groupby(by, observed=True)[STAY_MEASURES].sum()
@@ -0,0 +1,122 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from bookings import (optimize_dtypes, build_cube, merge_cubes, lead_time_measures, lead_time_category,
+                      test_column_names, HISTOGRAM_SPEC, CORRELATION_COLUMNS)
+from control_charts import arrival_dates
+from correlation import CorrelationAccumulator
+from histograms import (build_histograms, column_moments, merge_moments, histogram_layout, partial_histogram,
+                        merge_partial_histograms, finalize_histogram)
+from hypothesis_tests import contingency_frame
+from stays import daily_stays
+
+CHUNK_ROWS = 250000
+
+# Every page renders from these mergeable partial aggregates:
+#   rows         booking count
+#   cube         booking/ADR aggregate cube (booking, ADR, cancellation and guest pages)
+#   lead_time    ADR measures per lead time category and is_canceled
+#   contingency  category x is_canceled counts per tested column
+#   daily        per arrival date sums, for the control chart
+#   stays        room-nights and revenue per night of stay, hotel, segment and is_canceled
+#   correlation  CorrelationAccumulator over CORRELATION_COLUMNS
+#   moments      count/min/max/sums of the histogram columns
+#   histograms   finished Overview histograms
+
+def read_chunks(path, chunk_rows=CHUNK_ROWS):
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield optimize_dtypes(batch.to_pandas())
+    else:
+        for chunk in pd.read_csv(path, chunksize=chunk_rows):
+            yield optimize_dtypes(chunk)
+
+def daily_measures(df):
+    dates = pd.Series(arrival_dates(df), index=df.index, name='arrival_date')
+    values = pd.DataFrame({
+        'bookings': 1,
+        'lead_time': df['lead_time'].astype('float64'),
+        'adr': df['adr'].astype('float64'),
+        'is_canceled': df['is_canceled'].astype('float64'),
+    }, index=df.index)
+    return values.groupby(dates).sum()
+
+def chunk_summary(chunk):
+    y = chunk['is_canceled'].to_numpy()
+    contingency = {col: contingency_frame(chunk[col], y) for col in test_column_names(chunk)}
+    contingency['lead_time_category'] = contingency_frame(lead_time_category(chunk['lead_time']).rename('lead_time_category'), y)
+    return {
+        'rows': len(chunk),
+        'cube': build_cube(chunk),
+        'lead_time': lead_time_measures(chunk),
+        'contingency': contingency,
+        'daily': daily_measures(chunk),
+        'stays': daily_stays(chunk),
+        'correlation': CorrelationAccumulator([c for c in CORRELATION_COLUMNS if c in chunk.columns]).update(chunk),
+        'moments': {col: column_moments(chunk[col]) for col in HISTOGRAM_SPEC if col in chunk.columns},
+    }
+
+def _add_frames(a, b):
+    return a.add(b, fill_value=0)
+
+def merge_summaries(a, b):
+    return {
+        'rows': a['rows'] + b['rows'],
+        'cube': merge_cubes([a['cube'], b['cube']]),
+        'lead_time': _add_frames(a['lead_time'], b['lead_time']),
+        'contingency': {col: _add_frames(a['contingency'][col], b['contingency'][col]) for col in a['contingency']},
+        'daily': _add_frames(a['daily'], b['daily']),
+        'stays': _add_frames(a['stays'], b['stays']),
+        'correlation': a['correlation'].merge(b['correlation']),
+        'moments': {col: merge_moments(a['moments'][col], b['moments'][col]) for col in a['moments']},
+    }
+
+def parallel_map(func, items, n_jobs=None, max_pending=None):
+    # Like pool.map, but only keeps a few items in flight so a long chunk generator
+    # is never materialised; results come back in order
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if n_jobs == 1:
+        yield from map(func, items)
+        return
+    max_pending = max_pending or 2 * n_jobs
+    pending = []
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        for item in items:
+            pending.append(pool.submit(func, item))
+            if len(pending) >= max_pending:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+def _reduce(partials):
+    merged = None
+    for partial in partials:
+        merged = partial if merged is None else merge_summaries(merged, partial)
+    return merged
+
+def _histogram_chunk(args):
+    chunk, layouts = args
+    return {col: partial_histogram(chunk[col], layout) for col, layout in layouts.items()}
+
+def summarize_frame(df):
+    # In-memory data is one chunk
+    summary = chunk_summary(df)
+    summary['histograms'] = build_histograms(df, HISTOGRAM_SPEC)
+    return summary
+
+def summarize_source(path, chunk_rows=CHUNK_ROWS, n_jobs=None):
+    # Two streaming passes: the first builds every aggregate plus the value ranges
+    # that fix histogram edges, the second fills the histogram bins
+    summary = _reduce(parallel_map(chunk_summary, read_chunks(path, chunk_rows), n_jobs))
+
+    layouts = {col: histogram_layout(summary['moments'][col], bins, kde)
+               for col, (bins, kde) in HISTOGRAM_SPEC.items() if col in summary['moments']}
+    tasks = ((chunk, layouts) for chunk in read_chunks(path, chunk_rows))
+    partials = None
+    for partial in parallel_map(_histogram_chunk, tasks, n_jobs):
+        partials = partial if partials is None else {col: merge_partial_histograms(partials[col], partial[col]) for col in partial}
+    summary['histograms'] = {col: finalize_histogram(layouts[col], partials[col]) for col in layouts}
+    return summary
@@ -0,0 +1,244 @@
+import numpy as np
+import pandas as pd
+
+from bookings import CUBE_DIMENSIONS, CUBE_MEASURES, HISTOGRAM_SPEC, CORRELATION_COLUMNS, booking_measures, label_missing, lead_time_category, test_column_names
+from control_charts import arrival_dates
+from correlation import CorrelationAccumulator
+from filters import FILTER_COLUMNS, arrival_period
+from histograms import KDE_GRID_SIZE, column_moments, histogram_layout, histogram_rows, subset_histogram
+from hypothesis_tests import encode
+from stays import stay_layout, stays_from_changes
+
+# Summaries of any subset of the in-memory rows (the sidebar filters) without copying or
+# grouping the rows again. Rows with the same value in every filter column and the same
+# arrival month form a cell, and a filter always selects whole cells. build_subset_index()
+# adds up every summary piece once per (cell, group) pair, so the pieces of a selection are
+# bincounts over the pairs of its cells rather than over its rows.
+
+def cell_codes(df):
+    # The cell of every row and the first row of each cell
+    key = np.zeros(len(df), dtype='int64')
+    for series in [df[c] for c in FILTER_COLUMNS if c in df.columns] + [arrival_period(df)]:
+        codes, values = pd.factorize(series)
+        if key.max(initial=0) >= 2 ** 62 // (len(values) + 1):
+            key = pd.factorize(key)[0]
+        key = key * (len(values) + 1) + codes + 1
+    # factorize numbers cells in order of appearance, so each first row raises the running maximum
+    cells = pd.factorize(key)[0]
+    seen = np.maximum.accumulate(cells)
+    first_rows = np.flatnonzero(np.diff(seen, prepend=-1) > 0)
+    return cells.astype('int32'), first_rows
+
+def row_groups(keys):
+    # The keys of each group and the group of every row; rows with a missing key get the
+    # spare group len(groups), which selected_sums() leaves out
+    grouped = pd.Series(np.zeros(len(keys[0]), dtype='int8'), index=keys[0].index).groupby(keys, observed=True)
+    groups = grouped.size().index
+    codes = grouped.ngroup().fillna(len(groups)).to_numpy(dtype='int64')
+    return groups, codes
+
+def pair_sums(cells, codes, weights=None):
+    # Row count and the sum of each weight per (cell, code) pair
+    n_codes = int(codes.max(initial=0)) + 1
+    inverse, pairs = pd.factorize(cells.astype('int64') * n_codes + codes)
+    sums = {'cell': (pairs // n_codes).astype('int32'), 'code': (pairs % n_codes).astype('int32'), 'rows': np.bincount(inverse).astype('float64')}
+    for name, values in (weights or {}).items():
+        sums[name] = np.bincount(inverse, weights=values, minlength=len(pairs))
+    return sums
+
+def concat_sums(sums):
+    return {name: np.concatenate([s[name] for s in sums]) for name in sums[0]}
+
+def selected_sums(sums, cell_mask, size):
+    # Per code below `size`: the sums over the pairs of the selected cells
+    keep = np.flatnonzero(cell_mask[sums['cell']])
+    codes = sums['code'][keep]
+    return {name: np.bincount(codes, weights=values[keep], minlength=size)[:size]
+            for name, values in sums.items() if name not in ('cell', 'code')}
+
+def grouped_sums(cells, grouping, weights):
+    groups, codes = grouping
+    return groups, pair_sums(cells, codes, weights)
+
+def group_sums(grouped, cell_mask):
+    # Booking count and the sum of each weight per group
+    groups, sums = grouped
+    sums = selected_sums(sums, cell_mask, len(groups))
+    return pd.DataFrame({'bookings': sums.pop('rows').round().astype('int64'), **sums}, index=groups)
+
+def contingency_sums(df, cells):
+    # Category x is_canceled counts of each tested column, as pairs of cells and positions in
+    # one shared range of table cells; missing values go to a spare position at the end
+    y = df['is_canceled'].to_numpy(dtype='int64')
+    columns = [df[c] for c in test_column_names(df)] + [lead_time_category(df['lead_time']).rename('lead_time_category')]
+    encoded = [encode(series) for series in columns]
+    offsets = np.cumsum([0] + [2 * len(categories) for _, categories in encoded])
+    sums = concat_sums([pair_sums(cells, np.where(codes >= 0, offsets[i] + codes * 2 + y, offsets[-1]))
+                        for i, (codes, _) in enumerate(encoded)])
+    return {'sums': sums, 'offsets': offsets, 'columns': [(series.name, np.asarray(categories)) for series, (_, categories) in zip(columns, encoded)]}
+
+def stay_sums(df, cells):
+    # Arrivals and departures (with their ADR) per cell and flat difference array position
+    layout = stay_layout(df)
+    keep = layout['group'] >= 0
+    adr = {'adr': layout['adr'][keep]}
+    stays = {'layout': layout}
+    if keep.any():
+        stays['first'] = pair_sums(cells[keep], layout['first'][keep], adr)
+        stays['last'] = pair_sums(cells[keep], layout['last'][keep], adr)
+    return stays
+
+def histogram_sums(values, layout, cells):
+    values = np.asarray(values, dtype='float64')
+    finite = np.isfinite(values)
+    known = np.where(finite, values, 0.0)
+    rows = histogram_rows(values, layout)
+    sums = {
+        'layout': layout,
+        'bins': pair_sums(cells, rows['bins']),
+        # Code 0 holds the count, sum and sum of squares of the values that are present
+        'moments': pair_sums(cells, (~finite).astype('int64'), {'sum': known, 'sq_sum': known * known}),
+    }
+    if 'left' in rows:
+        sums['grid'] = pair_sums(cells, rows['left'], {'low': 1 - rows['frac'], 'high': rows['frac']})
+    return sums
+
+def correlation_sums(df, cells, n_cells, chunk_rows=2 ** 18):
+    # Per cell: count, sums and cross products (upper triangle) of its rows, taken minus the
+    # column means. Only cells with more rows than a cross product has entries per column
+    # are summed, so this is never larger than the rows themselves; the rows of the other
+    # cells, and rows with missing values, are kept as positions for the row-by-row path.
+    columns = [c for c in CORRELATION_COLUMNS if c in df.columns]
+    shift = np.array([df[c].astype('float64').mean() for c in columns])
+    upper = np.triu_indices(len(columns))
+    present = np.logical_and.reduce([df[c].notna().to_numpy() for c in columns])
+    summed = np.flatnonzero(np.bincount(cells[present], minlength=n_cells) > len(upper[0]) / len(columns))
+    slot = np.full(n_cells, -1)
+    slot[summed] = np.arange(len(summed))
+    slot = np.where(present, slot[cells], -1)
+
+    counts = np.zeros(len(summed))
+    sums = np.zeros((len(summed), len(columns)))
+    products = np.zeros((len(summed), len(upper[0])))
+    for start in range(0, len(df), chunk_rows):
+        chunk_slot = slot[start:start + chunk_rows]
+        keep = chunk_slot >= 0
+        chunk = df.iloc[start:start + chunk_rows]
+        x = np.column_stack([chunk[c].to_numpy(dtype='float64')[keep] for c in columns]) - shift
+        chunk_slot = chunk_slot[keep]
+        counts += np.bincount(chunk_slot, minlength=len(summed))
+        for i in range(len(columns)):
+            sums[:, i] += np.bincount(chunk_slot, weights=x[:, i], minlength=len(summed))
+        for k, (i, j) in enumerate(zip(*upper)):
+            products[:, k] += np.bincount(chunk_slot, weights=x[:, i] * x[:, j], minlength=len(summed))
+    return {'columns': columns, 'shift': shift, 'upper': upper, 'cells': summed, 'counts': counts, 'sums': sums,
+            'products': products, 'rows': np.flatnonzero(slot < 0)}
+
+def build_subset_index(df):
+    cells, first_rows = cell_codes(df)
+    measures = booking_measures(df)
+    weights = {c: measures[c].to_numpy(dtype='float64') for c in CUBE_MEASURES if c != 'bookings'}
+    daily_keys = [pd.Series(arrival_dates(df), index=df.index, name='arrival_date')]
+    lead_time_keys = [lead_time_category(df['lead_time']).rename('lead_time_category'), df['is_canceled']]
+    return {
+        'df': df,
+        'cells': cells,
+        'first_rows': first_rows,
+        'cube': grouped_sums(cells, row_groups([label_missing(df[c]) for c in CUBE_DIMENSIONS if c in df.columns]), weights),
+        'lead_time': grouped_sums(cells, row_groups(lead_time_keys), weights),
+        'daily': grouped_sums(cells, row_groups(daily_keys), {c: df[c].to_numpy(dtype='float64') for c in ['lead_time', 'adr', 'is_canceled']}),
+        'contingency': contingency_sums(df, cells),
+        'stays': stay_sums(df, cells),
+        'correlation': correlation_sums(df, cells, len(first_rows)),
+        'histograms': {col: histogram_sums(df[col], histogram_layout(column_moments(df[col]), bins, kde), cells)
+                       for col, (bins, kde) in HISTOGRAM_SPEC.items() if col in df.columns},
+    }
+
+def subset_cube(index, cell_mask):
+    cube = group_sums(index['cube'], cell_mask)[CUBE_MEASURES]
+    cube['nights'] = cube['nights'].round().astype('int64')
+    return cube[cube['bookings'] > 0].reset_index()
+
+def subset_lead_time(index, cell_mask):
+    lead_time = group_sums(index['lead_time'], cell_mask)[CUBE_MEASURES]
+    lead_time['nights'] = lead_time['nights'].round().astype('int64')
+    return lead_time
+
+def subset_daily(index, cell_mask):
+    daily = group_sums(index['daily'], cell_mask)
+    return daily[daily['bookings'] > 0]
+
+def subset_contingency(index, cell_mask):
+    contingency = index['contingency']
+    offsets = contingency['offsets']
+    counts = selected_sums(contingency['sums'], cell_mask, offsets[-1])['rows'].round().astype('int64')
+    return {
+        name: pd.DataFrame(counts[offsets[i]:offsets[i + 1]].reshape(-1, 2), index=pd.Index(categories, name=name), columns=[0, 1])
+        for i, (name, categories) in enumerate(contingency['columns'])
+    }
+
+def subset_stays(index, cell_mask):
+    stays = index['stays']
+    layout = stays['layout']
+    if 'first' not in stays:
+        return stays_from_changes(layout, None, None)
+    size = len(layout['keys']) * layout['n_dates']
+    first = selected_sums(stays['first'], cell_mask, size)
+    last = selected_sums(stays['last'], cell_mask, size)
+    return stays_from_changes(layout, (first['rows'] - last['rows']).round().astype('int64'), first['adr'] - last['adr'])
+
+def subset_histogram_of(sums, cell_mask):
+    layout = sums['layout']
+    n_bins = len(layout['edges']) - 1
+    counts = selected_sums(sums['bins'], cell_mask, n_bins)['rows'].round().astype('int64')
+    moments = selected_sums(sums['moments'], cell_mask, 1)
+    moments = {'n': int(round(moments['rows'][0])), 'sum': moments['sum'][0], 'sq_sum': moments['sq_sum'][0]}
+    grid_counts = None
+    if 'grid' in sums:
+        grid = selected_sums(sums['grid'], cell_mask, KDE_GRID_SIZE)
+        grid_counts = grid['low'] + np.r_[0.0, grid['high'][:-1]]
+    return subset_histogram(layout, counts, moments, grid_counts)
+
+def subset_correlation(index, cell_mask):
+    sums = index['correlation']
+    columns = sums['columns']
+    weights = cell_mask[sums['cells']].astype('float64')
+    products = np.zeros((len(columns), len(columns)))
+    products[sums['upper']] = weights @ sums['products']
+    products = products + np.triu(products, 1).T
+    accumulator = CorrelationAccumulator.from_sums(columns, weights @ sums['counts'], weights @ sums['sums'], products, sums['shift'])
+    rows = sums['rows'][cell_mask[index['cells'][sums['rows']]]]
+    if len(rows):
+        # Gathered straight into one float block, which the accumulator reads without another copy
+        df = index['df']
+        values = np.empty((len(rows), len(columns)), order='F')
+        for i, c in enumerate(columns):
+            values[:, i] = df[c].to_numpy()[rows]
+        accumulator.update(pd.DataFrame(values, columns=columns, copy=False))
+    return accumulator
+
+SUBSET_PIECES = {
+    'cube': subset_cube,
+    'lead_time': subset_lead_time,
+    'daily': subset_daily,
+    'contingency': subset_contingency,
+    'stays': subset_stays,
+    'correlation': subset_correlation,
+    'histograms': lambda index, cell_mask: {col: subset_histogram_of(sums, cell_mask) for col, sums in index['histograms'].items()},
+}
+
+class SubsetSummary(dict):
+    # The summary of the rows selected by a boolean mask, with the same pieces as
+    # streaming.summarize_frame(). Each piece is computed the first time a page reads it.
+
+    def __init__(self, index, mask):
+        super().__init__(rows=int(mask.sum()), mask=mask)
+        self.index = index
+        # A filter selects whole cells, so each cell's first row stands for all of them
+        self.cell_mask = mask[index['first_rows']]
+
+    def __missing__(self, name):
+        if name not in SUBSET_PIECES:
+            raise KeyError(name)
+        value = self[name] = SUBSET_PIECES[name](self.index, self.cell_mask)
+        return value
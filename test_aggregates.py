@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bookings import MONTHS_ORDER, optimize_dtypes, rollup, stay_nights
+from control_charts import arrival_dates, cusum
+from correlation import CorrelationAccumulator
+from filters import build_filter_index, filter_mask, arrival_period
+from stays import STAY_DIMENSIONS, daily_stays
+from streaming import summarize_frame, summarize_source
+from subsets import SUBSET_PIECES, SubsetSummary, build_subset_index
+
+def bookings(n, seed=0):
+    # Just the columns the summaries read, with a few missing countries and children
+    rng = np.random.default_rng(seed)
+
+    def pick(values, size=n):
+        return np.array(values, dtype=object)[rng.integers(0, len(values), size)]
+
+    country = pick(['PRT', 'GBR', 'FRA', 'ESP', 'DEU'])
+    country[rng.random(n) < 0.02] = np.nan
+    children = rng.integers(0, 3, n).astype('float64')
+    children[rng.random(n) < 0.01] = np.nan
+    month = pick(MONTHS_ORDER)
+    return pd.DataFrame({
+        'hotel': pick(['City Hotel', 'Resort Hotel']),
+        'is_canceled': (rng.random(n) < 0.37).astype('int64'),
+        'lead_time': rng.exponential(100, n).astype('int64'),
+        'arrival_date_year': rng.integers(2015, 2018, n),
+        'arrival_date_month': month,
+        'arrival_date_week_number': rng.integers(1, 54, n),
+        'arrival_date_day_of_month': rng.integers(1, 29, n),
+        'stays_in_weekend_nights': rng.poisson(1, n),
+        'stays_in_week_nights': rng.poisson(2.5, n),
+        'adults': rng.integers(1, 4, n),
+        'children': children,
+        'meal': pick(['BB', 'HB', 'SC']),
+        'country': country,
+        'market_segment': pick(['Online TA', 'Offline TA/TO', 'Groups', 'Direct']),
+        'is_repeated_guest': (rng.random(n) < 0.05).astype('int64'),
+        'deposit_type': pick(['No Deposit', 'Non Refund']),
+        'customer_type': pick(['Transient', 'Contract', 'Group']),
+        'adr': np.round(rng.gamma(4, 25, n), 2),
+        'guest_type': pick(['Single', 'Couple', 'Family']),
+        'season': pick(['Winter', 'Spring', 'Summer', 'Fall']),
+    })
+
+def assert_frames_equal(a, b):
+    pd.testing.assert_frame_equal(a.sort_index(), b.sort_index(), check_dtype=False, check_index_type=False,
+                                  check_categorical=False)
+
+def test_streaming_summary_matches_in_memory(tmp_path):
+    df = bookings(3000)
+    path = str(tmp_path / 'bookings.csv')
+    df.to_csv(path, index=False)
+    memory = summarize_frame(optimize_dtypes(pd.read_csv(path)))
+    streamed = summarize_source(path, chunk_rows=700, n_jobs=1)
+
+    assert streamed['rows'] == memory['rows'] == len(df)
+    assert memory['cube']['bookings'].sum() == len(df)
+    dims = [c for c in memory['cube'].columns if c not in ('bookings', 'adr_sum', 'adr_sq_sum', 'nights', 'revenue_sum', 'revenue_sq_sum')]
+    assert_frames_equal(rollup(streamed['cube'], dims), rollup(memory['cube'], dims))
+    assert_frames_equal(streamed['lead_time'], memory['lead_time'])
+    assert_frames_equal(streamed['daily'], memory['daily'])
+    assert_frames_equal(streamed['stays'], memory['stays'])
+    assert streamed['contingency'].keys() == memory['contingency'].keys()
+    for column, table in memory['contingency'].items():
+        assert_frames_equal(streamed['contingency'][column], table)
+    pd.testing.assert_frame_equal(streamed['correlation'].matrix(), memory['correlation'].matrix())
+    for column, histogram in memory['histograms'].items():
+        np.testing.assert_array_equal(streamed['histograms'][column]['edges'], histogram['edges'])
+        np.testing.assert_array_equal(streamed['histograms'][column]['counts'], histogram['counts'])
+        if 'density' in histogram:
+            np.testing.assert_allclose(streamed['histograms'][column]['density'], histogram['density'], atol=1e-12)
+
+def test_correlation_accumulator_matches_pandas():
+    df = bookings(2000, seed=1)
+    columns = ['is_canceled', 'lead_time', 'adults', 'children', 'adr', 'stays_in_week_nights']
+    accumulator = CorrelationAccumulator.from_frame(df, columns, chunk_size=300)
+    pd.testing.assert_frame_equal(accumulator.matrix(), df[columns].corr())
+
+def test_daily_stays_matches_one_row_per_night():
+    df = bookings(500, seed=2)
+    nights = stay_nights(df)
+    exploded = df.loc[df.index.repeat(nights), STAY_DIMENSIONS + ['adr']]
+    exploded['stay_date'] = arrival_dates(df).repeat(nights) + np.concatenate([np.arange(k) for k in nights]).astype('timedelta64[D]')
+    expected = exploded.groupby(['stay_date'] + STAY_DIMENSIONS).agg(room_nights=('adr', 'size'), revenue=('adr', 'sum'))
+    assert_frames_equal(daily_stays(df), expected)
+
+def test_cusum_matches_recursion():
+    x = np.random.default_rng(3).normal(size=500)
+    target, k = 0.1, 0.5
+    upper, lower = cusum(x, target, k)
+    s_upper = s_lower = 0.0
+    for i, value in enumerate(x):
+        s_upper = max(0.0, s_upper + value - target - k)
+        s_lower = max(0.0, s_lower + target - k - value)
+        assert upper[i] == pytest.approx(s_upper)
+        assert lower[i] == pytest.approx(s_lower)
+
+def test_filter_mask_matches_pandas():
+    df = optimize_dtypes(bookings(1000, seed=4))
+    index = build_filter_index(df)
+    selections = {'hotel': ['Resort Hotel'], 'country': ['PRT', 'ESP'], 'arrival_period': [201601, 201602, 201603]}
+    expected = (df['hotel'] == 'Resort Hotel') & df['country'].isin(['PRT', 'ESP']) & arrival_period(df).isin([201601, 201602, 201603])
+    np.testing.assert_array_equal(filter_mask(index, selections), expected.to_numpy())
+    assert filter_mask(index, {}) is None
+
+def test_subset_summary_matches_filtered_frame():
+    df = optimize_dtypes(bookings(3000, seed=5))
+    mask = filter_mask(build_filter_index(df), {'hotel': ['City Hotel'], 'country': ['PRT', 'GBR', 'ESP']})
+    subset = SubsetSummary(build_subset_index(df), mask)
+    expected = summarize_frame(df[mask].reset_index(drop=True))
+
+    assert subset['rows'] == expected['rows'] == mask.sum()
+    assert set(SUBSET_PIECES) <= set(expected)
+    dims = [c for c in expected['cube'].columns if c not in ('bookings', 'adr_sum', 'adr_sq_sum', 'nights', 'revenue_sum', 'revenue_sq_sum')]
+    assert_frames_equal(rollup(subset['cube'], dims), rollup(expected['cube'], dims))
+    assert_frames_equal(subset['lead_time'], expected['lead_time'])
+    assert_frames_equal(subset['daily'], expected['daily'])
+    assert_frames_equal(subset['stays'], expected['stays'])
+    for column, table in expected['contingency'].items():
+        # The subset keeps every category of the full data, including ones it has no rows for
+        observed = subset['contingency'][column]
+        assert_frames_equal(observed[observed.sum(axis=1) > 0], table[table.sum(axis=1) > 0])
+    pd.testing.assert_frame_equal(subset['correlation'].matrix(), expected['correlation'].matrix())
+    for column, histogram in subset['histograms'].items():
+        # On the bin edges of the full data, so filtered histograms share its axes
+        values = df.loc[mask, column].to_numpy(dtype='float64')
+        np.testing.assert_array_equal(histogram['counts'], np.histogram(values[np.isfinite(values)], bins=histogram['edges'])[0])
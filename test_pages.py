@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+# Skipped where streamlit is installed but cannot load (e.g. a pyarrow built for another numpy)
+pytest.importorskip('streamlit', exc_type=ImportError)
+
+import report
+from report import app
+from benchmark import synthetic_bookings
+from bookings import optimize_dtypes
+from chart_cache import ChartCache
+from subsets import SubsetSummary, build_subset_index
+
+@pytest.fixture(scope='module')
+def bookings():
+    df = optimize_dtypes(synthetic_bookings(3000, seed=0))
+    return df, build_subset_index(df)
+
+def small_views(df):
+    # Slices a sidebar filter can produce that the full data never does
+    rng = np.random.default_rng(0)
+    canceled = df['is_canceled'].to_numpy() == 1
+    repeated = df['is_repeated_guest'].to_numpy() == 1
+    yield 'one booking', np.arange(len(df)) == rng.integers(len(df))
+    yield 'one cancelled booking', np.arange(len(df)) == np.flatnonzero(canceled)[0]
+    yield 'cancelled only', canceled & (df['country'] == 'PRT').to_numpy()
+    yield 'no repeated guests', ~repeated & (df['hotel'] == 'Resort Hotel').to_numpy()
+    yield 'no bookings', np.zeros(len(df), dtype=bool)
+
+def test_every_page_renders_on_small_filtered_views(bookings, monkeypatch):
+    df, index = bookings
+    # Draw every chart instead of reusing PNGs across views
+    monkeypatch.setattr(app, 'chart_cache', lambda: ChartCache(0))
+    for name, mask in small_views(df):
+        summary = SubsetSummary(index, mask)
+        summary['key'] = ('test', name)
+        for page in app.PAGE_NAMES:
+            recorder = report.record_page(page, df, summary)
+            assert recorder.blocks, (name, page)
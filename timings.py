@@ -0,0 +1,38 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+class Timings:
+    # Wall time of the named sections of one script run, in the order they finished
+
+    def __init__(self):
+        self.sections = []
+
+    @contextmanager
+    def section(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name, ms):
+        self.sections.append((name, ms))
+
+    def record(self, **fields):
+        # One JSON object per run for the structured log; repeated sections are summed
+        sections = {}
+        for name, ms in self.sections:
+            sections[name] = sections.get(name, 0) + ms
+        return json.dumps({'time': time.time(), **fields, 'sections_ms': {name: round(ms, 2) for name, ms in sections.items()}})
+
+def json_lines_logger(path, name='hotel_timings'):
+    # Plain JSON lines: the message is the whole record. Call once per process and path.
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    return logger